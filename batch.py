@@ -0,0 +1,160 @@
+import glob
+import pathlib
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from bedrock import get_bedrock_client
+from pdf_parser import parse_pdf
+from image_analyzer import analyze_images_in_markdown
+from content_enhancer import enhance_content
+from pipeline import run_pipeline
+from incremental import process_incremental
+from batch_inference import process_documents
+from checkpoint import Checkpoint
+from glossary import glossary_course
+from utils import get_pdf_name
+from config import CHECKPOINT_ENABLED, MAX_BATCH_DOCUMENTS, PIPELINE_ENABLED, INCREMENTAL_ENABLED, BATCH_INFERENCE_ENABLED
+
+def find_pdfs(target):
+    """파일, 디렉토리 또는 glob 패턴에 해당하는 PDF 파일 목록"""
+    path = pathlib.Path(target)
+    if path.is_dir():
+        return sorted(path.glob('*.pdf'))
+    if path.is_file():
+        return [path]
+    return sorted(pathlib.Path(p) for p in glob.glob(target) if p.lower().endswith('.pdf'))
+
+def duplicate_pdf_names(pdf_paths):
+    """파일 이름이 같은 PDF 목록 {파일 이름: [경로]} (출력 파일과 체크포인트가 파일 이름 기준이라 함께 처리할 수 없음)"""
+    paths_by_name = {}
+    for pdf_path in pdf_paths:
+        paths_by_name.setdefault(get_pdf_name(pdf_path), []).append(pdf_path)
+    return {name: paths for name, paths in paths_by_name.items() if len(paths) > 1}
+
+def parse_document(pdf_path, summary):
+    """문서 파싱 단계 실행"""
+    started_at = time.monotonic()
+    summary['checkpoint'] = Checkpoint(pdf_path) if CHECKPOINT_ENABLED else None
+    init_md_path = parse_pdf(pdf_path, checkpoint=summary['checkpoint'])
+    summary['timings']['parse'] = time.monotonic() - started_at
+    return init_md_path
+
+def enhance_document(bedrock_client, init_md_path, summary):
+    """파싱된 문서의 이미지 분석과 콘텐츠 개선 단계 실행"""
+    started_at = time.monotonic()
+    if INCREMENTAL_ENABLED:
+        final_md_path = process_incremental(init_md_path, bedrock_client=bedrock_client, course=summary['course'])
+        summary['timings']['incremental'] = time.monotonic() - started_at
+        return final_md_path
+    if PIPELINE_ENABLED:
+        final_md_path = run_pipeline(
+            init_md_path, checkpoint=summary['checkpoint'], bedrock_client=bedrock_client, course=summary['course']
+        )
+        summary['timings']['pipeline'] = time.monotonic() - started_at
+        return final_md_path
+
+    enhanced_md_path = analyze_images_in_markdown(
+        init_md_path, checkpoint=summary['checkpoint'], bedrock_client=bedrock_client
+    )
+    summary['timings']['images'] = time.monotonic() - started_at
+
+    started_at = time.monotonic()
+    final_md_path = enhance_content(
+        enhanced_md_path, checkpoint=summary['checkpoint'], bedrock_client=bedrock_client, course=summary['course']
+    )
+    summary['timings']['enhance'] = time.monotonic() - started_at
+    return final_md_path
+
+def run_batch_inference(bedrock_client, summaries):
+    """모든 PDF를 파싱한 뒤 이미지 분석과 콘텐츠 개선 요청을 문서 전체에 걸쳐 각각 하나의 Bedrock 배치 추론 작업으로 처리"""
+    parsed = {}
+    for summary in summaries:
+        try:
+            init_md_path = parse_document(summary['pdf'], summary)
+        except Exception as e:
+            summary.update({'status': 'failed', 'error': f"parse: {str(e)}"})
+            print(f"Error parsing {summary['pdf']}: {str(e)}")
+            continue
+        print(f"Parsed {summary['pdf']}: {init_md_path}")
+        parsed[init_md_path] = summary
+
+    started_at = time.monotonic()
+    try:
+        final_paths = process_documents(
+            list(parsed), bedrock_client=bedrock_client,
+            courses={init_md_path: summary['course'] for init_md_path, summary in parsed.items()}
+        )
+    except Exception as e:
+        for summary in parsed.values():
+            summary.update({'status': 'failed', 'error': f"batch inference: {str(e)}"})
+        print(f"Error in batch inference: {str(e)}")
+        return summaries
+    for init_md_path, summary in parsed.items():
+        # 문서들이 같은 배치 작업을 공유하므로 모든 문서에 같은 소요 시간을 기록
+        summary['timings']['batch_inference'] = time.monotonic() - started_at
+        summary['output'] = final_paths.get(init_md_path)
+        summary['status'] = 'completed' if summary['output'] else 'failed'
+    return summaries
+
+def run_batch(pdf_paths, max_documents=MAX_BATCH_DOCUMENTS):
+    """여러 PDF를 하나의 파이프라인으로 처리하고 문서별 결과 요약을 반환 (파일 이름이 같은 PDF가 있으면 ValueError)"""
+    duplicates = duplicate_pdf_names(pdf_paths)
+    if duplicates:
+        raise ValueError(f"PDF files with the same name cannot be processed together: {format_duplicates(duplicates)}")
+    # Bedrock 클라이언트, 레이트 리미터, 응답 캐시, 동시 요청 수 제한은 모든 문서가 공유
+    bedrock_client = get_bedrock_client()
+    summaries = [
+        {'pdf': pdf_path, 'course': glossary_course(pdf_path), 'status': 'pending', 'timings': {}} for pdf_path in pdf_paths
+    ]
+    if BATCH_INFERENCE_ENABLED:
+        return run_batch_inference(bedrock_client, summaries)
+
+    # PDF 파싱은 하나씩 순서대로 진행하고, 파싱이 끝난 문서는 바로 이미지 분석과 콘텐츠 개선으로 넘겨
+    # 다음 PDF 파싱이 앞 문서의 Bedrock 대기와 겹치도록 함
+    with ThreadPoolExecutor(max_workers=1) as parse_executor, \
+            ThreadPoolExecutor(max_workers=max_documents) as document_executor:
+        parse_futures = {
+            parse_executor.submit(parse_document, summary['pdf'], summary): summary for summary in summaries
+        }
+        document_futures = {}
+        for future in as_completed(parse_futures):
+            summary = parse_futures[future]
+            try:
+                init_md_path = future.result()
+            except Exception as e:
+                summary.update({'status': 'failed', 'error': f"parse: {str(e)}"})
+                print(f"Error parsing {summary['pdf']}: {str(e)}")
+                continue
+            print(f"Parsed {summary['pdf']}: {init_md_path}")
+            document_futures[document_executor.submit(enhance_document, bedrock_client, init_md_path, summary)] = summary
+
+        for future in as_completed(document_futures):
+            summary = document_futures[future]
+            try:
+                summary['output'] = future.result()
+            except Exception as e:
+                summary.update({'status': 'failed', 'error': str(e)})
+                print(f"Error processing {summary['pdf']}: {str(e)}")
+                continue
+            summary['status'] = 'completed' if summary['output'] else 'failed'
+
+    return summaries
+
+def format_duplicates(duplicates):
+    """파일 이름이 같은 PDF 목록을 한 줄로 표시"""
+    return '; '.join(', '.join(str(path) for path in paths) for paths in duplicates.values())
+
+def print_batch_summary(summaries):
+    """문서별 처리 결과 요약 출력"""
+    print("\nBatch summary:")
+    for summary in summaries:
+        timings = ', '.join(f"{stage} {seconds:.1f}s" for stage, seconds in summary['timings'].items())
+        line = f"  {summary['pdf']}: {summary['status']}"
+        if timings:
+            line += f" ({timings})"
+        if summary.get('output'):
+            line += f" -> {summary['output']}"
+        if summary.get('error'):
+            line += f" - {summary['error']}"
+        print(line)
+    completed = sum(1 for summary in summaries if summary['status'] == 'completed')
+    print(f"{completed}/{len(summaries)} documents completed")
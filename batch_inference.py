@@ -0,0 +1,357 @@
+import json
+import os
+import pathlib
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+import boto3
+from cache import get_response_cache
+from bedrock import invoke_model, get_bedrock_client
+from metrics import get_metrics
+from model_router import route_image, route_chunk, model_for
+from image_analyzer import image_prompt, build_image_request, find_image_names, filter_images, group_images, write_enhanced_markdown
+from content_enhancer import INSTRUCTION, build_chunk_request, chunk_cache_payload
+from glossary import get_glossary, glossary_course
+from chunker import iter_chunks, iter_markdown_pages
+from utils import OrderedWriter, hash_file, iter_lines
+from config import (
+    BEDROCK_REGION, BEDROCK_MODEL_ID, CHECKPOINT_DIR, MAX_CONCURRENT_REQUESTS, IMAGE_FILTER_ENABLED, IMAGE_DEDUP_ENABLED,
+    BATCH_BACKEND, BATCH_S3_URI, BATCH_ROLE_ARN, BATCH_LOCAL_DIR, BATCH_DIR, BATCH_MIN_RECORDS, BATCH_POLL_INTERVAL,
+    BATCH_JOB_TIMEOUT_HOURS
+)
+
+# 작업 상태: 완료(일부 레코드 실패 포함)와 실패로 끝난 상태
+COMPLETED_STATUSES = ('Completed', 'PartiallyCompleted')
+FAILED_STATUSES = ('Failed', 'Stopped', 'Expired')
+
+class BedrockBatchBackend:
+    """입력 JSONL을 S3에 올리고 Bedrock 배치 추론 작업(CreateModelInvocationJob)을 제출/조회하는 백엔드"""
+
+    def __init__(self, s3_uri=BATCH_S3_URI, role_arn=BATCH_ROLE_ARN, model_id=BEDROCK_MODEL_ID,
+                 timeout_hours=BATCH_JOB_TIMEOUT_HOURS):
+        self.bucket, _, self.prefix = s3_uri.removeprefix('s3://').partition('/')
+        self.prefix = self.prefix.strip('/')
+        self.role_arn = role_arn
+        self.model_id = model_id
+        self.timeout_hours = timeout_hours
+        self.bedrock = boto3.client(service_name='bedrock', region_name=BEDROCK_REGION)
+        self.s3 = boto3.client(service_name='s3', region_name=BEDROCK_REGION)
+
+    def submit(self, job_name, input_path, model_id=None):
+        """입력 파일을 올리고 model_id(없으면 백엔드 기본 모델)로 작업을 제출하여 작업 ID(ARN) 반환"""
+        job_prefix = f"{self.prefix}/{job_name}" if self.prefix else job_name
+        key = f"{job_prefix}/input/{input_path.name}"
+        self.s3.upload_file(str(input_path), self.bucket, key)
+        response = self.bedrock.create_model_invocation_job(
+            jobName=job_name,
+            roleArn=self.role_arn,
+            modelId=model_id or self.model_id,
+            inputDataConfig={'s3InputDataConfig': {'s3Uri': f"s3://{self.bucket}/{key}", 's3InputFormat': 'JSONL'}},
+            outputDataConfig={'s3OutputDataConfig': {'s3Uri': f"s3://{self.bucket}/{job_prefix}/output/"}},
+            timeoutDurationInHours=self.timeout_hours,
+        )
+        return response['jobArn']
+
+    def status(self, job_id):
+        return self.bedrock.get_model_invocation_job(jobIdentifier=job_id)['status']
+
+    def fetch(self, job_id, output_dir):
+        """결과 파일({출력 경로}/{작업 ID}/{입력 파일명}.out)을 내려받아 로컬 경로 반환"""
+        job = self.bedrock.get_model_invocation_job(jobIdentifier=job_id)
+        input_name = job['inputDataConfig']['s3InputDataConfig']['s3Uri'].rsplit('/', 1)[-1]
+        output_uri = job['outputDataConfig']['s3OutputDataConfig']['s3Uri'].removeprefix('s3://')
+        bucket, _, prefix = output_uri.partition('/')
+        key = f"{prefix.rstrip('/')}/{job_id.rsplit('/', 1)[-1]}/{input_name}.out".lstrip('/')
+        output_path = pathlib.Path(output_dir) / f"{input_name}.out"
+        self.s3.download_file(bucket, key, str(output_path))
+        return output_path
+
+class DirectoryBatchBackend:
+    """로컬 디렉토리로 배치 추론 작업을 흉내내는 백엔드 ({디렉토리}/{작업 이름}/input, output)
+
+    bedrock_client를 주면 상태 조회 시 레코드를 직접 호출하여 결과 파일을 만들고,
+    없으면 다른 프로세스가 output/{입력 파일명}.out을 만들 때까지 작업이 진행 중인 것으로 봄
+    """
+
+    def __init__(self, directory=BATCH_LOCAL_DIR, bedrock_client=None, model_id=BEDROCK_MODEL_ID):
+        self.directory = pathlib.Path(directory)
+        self.bedrock_client = bedrock_client
+        self.model_id = model_id
+
+    def _paths(self, job_id):
+        input_paths = list((self.directory / job_id / 'input').glob('*.jsonl'))
+        return input_paths[0], self.directory / job_id / 'output' / f"{input_paths[0].name}.out"
+
+    def submit(self, job_name, input_path, model_id=None):
+        job_dir = self.directory / job_name
+        (job_dir / 'input').mkdir(parents=True, exist_ok=True)
+        (job_dir / 'output').mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(input_path, job_dir / 'input' / input_path.name)
+        (job_dir / 'job.json').write_text(json.dumps({'model_id': model_id or self.model_id}), encoding='utf-8')
+        return job_name
+
+    def status(self, job_id):
+        input_path, output_path = self._paths(job_id)
+        if not output_path.exists() and self.bedrock_client:
+            job_path = self.directory / job_id / 'job.json'
+            model_id = json.loads(job_path.read_text(encoding='utf-8'))['model_id'] if job_path.exists() else self.model_id
+            self.run_job(input_path, output_path, model_id)
+        return 'Completed' if output_path.exists() else 'InProgress'
+
+    def run_job(self, input_path, output_path, model_id=None):
+        """입력 레코드를 호출하여 Bedrock 배치 추론과 같은 형식의 결과 파일 작성"""
+        model_id = model_id or self.model_id
+
+        def run_record(line):
+            record = json.loads(line)
+            try:
+                response = self.bedrock_client.invoke_model(modelId=model_id, body=json.dumps(record['modelInput']))
+                record['modelOutput'] = json.loads(response['body'].read().decode())
+            except Exception as e:
+                record['error'] = {'errorCode': 500, 'errorMessage': str(e)}
+            return json.dumps(record, ensure_ascii=False)
+
+        with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as executor:
+            results = list(executor.map(run_record, [line for line in iter_lines(input_path) if line]))
+        tmp_path = output_path.with_name(f"{output_path.name}.tmp")
+        tmp_path.write_text('\n'.join(results) + '\n', encoding='utf-8')
+        os.replace(tmp_path, output_path)
+
+    def fetch(self, job_id, output_dir):
+        _, output_path = self._paths(job_id)
+        local_path = pathlib.Path(output_dir) / output_path.name
+        shutil.copyfile(output_path, local_path)
+        return local_path
+
+def get_batch_backend(bedrock_client=None):
+    """config.py의 BATCH_BACKEND에 해당하는 백엔드 생성"""
+    if BATCH_BACKEND == 'directory':
+        return DirectoryBatchBackend(bedrock_client=bedrock_client)
+    return BedrockBatchBackend()
+
+def write_records(input_path, requests):
+    """요청을 배치 추론 입력 형식({"recordId", "modelInput"})의 JSONL로 한 줄씩 기록 (요청 본문은 기록할 때 생성)"""
+    with input_path.open('w', encoding='utf-8') as f:
+        for record_id, (_, build_request, _) in requests.items():
+            f.write(json.dumps({'recordId': record_id, 'modelInput': build_request()}, ensure_ascii=False))
+            f.write('\n')
+
+def read_results(output_path, stage, routes=None, model_id=None):
+    """결과 JSONL에서 {레코드 ID: 응답 텍스트} 반환 (에러 레코드는 제외하고 사용량은 stage 이름과 레코드의 라우팅 경로로 기록)"""
+    routes = routes or {}
+    results = {}
+    for line in iter_lines(output_path):
+        if not line:
+            continue
+        record = json.loads(line)
+        output = record.get('modelOutput')
+        if record.get('error') or not output:
+            error = record.get('error') or {}
+            print(f"Error in batch record {record.get('recordId')}: {error.get('errorMessage', 'no output')}")
+            get_metrics().record_call(
+                stage, 0.0, error=str(error.get('errorCode', 'NoOutput')), model=model_id, route=routes.get(record.get('recordId'))
+            )
+            continue
+        # 배치 레코드는 개별 지연 시간이 없으므로 사용량만 기록
+        get_metrics().record_call(stage, 0.0, usage=output.get('usage'), model=model_id, route=routes.get(record['recordId']))
+        results[record['recordId']] = output['content'][0]['text']
+    return results
+
+def wait_for_job(backend, job_id, poll_interval=BATCH_POLL_INTERVAL):
+    """작업이 끝날 때까지 상태를 조회하고 마지막 상태 반환"""
+    last_status = None
+    while True:
+        status = backend.status(job_id)
+        if status != last_status:
+            print(f"Batch job {job_id}: {status}")
+            last_status = status
+        if status in COMPLETED_STATUSES or status in FAILED_STATUSES:
+            return status
+        time.sleep(poll_interval)
+
+def run_job(backend, job_name, requests, stage, batch_dir=BATCH_DIR, poll_interval=BATCH_POLL_INTERVAL,
+            model_id=BEDROCK_MODEL_ID):
+    """요청을 model_id 모델의 배치 작업 하나로 실행하고 {레코드 ID: 응답 텍스트} 반환
+
+    입력 파일 해시를 작업 이름에 넣고 제출한 작업 ID를 체크포인트 디렉토리에 기록하므로,
+    결과를 기다리는 도중 중단되어도 같은 입력으로 다시 실행하면 작업을 다시 제출하지 않고 이어서 기다림
+    """
+    batch_dir = pathlib.Path(batch_dir)
+    batch_dir.mkdir(parents=True, exist_ok=True)
+    input_path = batch_dir / f"{job_name}.jsonl"
+    write_records(input_path, requests)
+    job_name = f"{job_name}-{hash_file(input_path)[:16]}"
+    final_input_path = input_path.with_name(f"{job_name}.jsonl")
+    os.replace(input_path, final_input_path)
+
+    state_path = pathlib.Path(CHECKPOINT_DIR) / f"{job_name}.batch.json"
+    state_path.parent.mkdir(parents=True, exist_ok=True)
+    if state_path.exists():
+        job_id = json.loads(state_path.read_text(encoding='utf-8'))['job_id']
+        print(f"Resuming batch job {job_id} ({len(requests)} records)")
+    else:
+        job_id = backend.submit(job_name, final_input_path, model_id)
+        state_path.write_text(json.dumps({'job_id': job_id, 'records': len(requests)}), encoding='utf-8')
+        print(f"Submitted batch job {job_id} ({len(requests)} records)")
+
+    status = wait_for_job(backend, job_id, poll_interval)
+    if status in FAILED_STATUSES:
+        # 실패한 작업은 다음 실행에서 다시 제출
+        state_path.unlink()
+        raise RuntimeError(f"Batch job {job_id} ended with status {status}")
+    routes = {record_id: route for record_id, (_, _, route) in requests.items()}
+    return read_results(backend.fetch(job_id, batch_dir), stage, routes, model_id)
+
+def run_requests(requests, stage, backend, bedrock_client, min_records=BATCH_MIN_RECORDS,
+                 poll_interval=BATCH_POLL_INTERVAL):
+    """{레코드 ID: (캐시 키, 요청 본문 생성 함수, 라우팅 경로)}를 처리하여 {레코드 ID: 응답 텍스트 또는 None} 반환
+
+    캐시에 있는 요청은 제외하고, 배치 작업은 모델 하나로만 실행되므로 남은 요청을 경로의 모델별로 나눈 뒤
+    min_records 이상인 모델은 배치 작업으로, 적거나 배치 작업에서 실패한 요청은 일반 호출로 처리
+    """
+    cache = get_response_cache()
+    results = {}
+    pending = {}
+    for record_id, (cache_key, build_request, route) in requests.items():
+        cached = cache.get(cache_key) if cache else None
+        if cached is not None:
+            results[record_id] = cached
+        else:
+            pending[record_id] = (cache_key, build_request, route)
+
+    pending_by_model = {}
+    for record_id, (_, _, route) in pending.items():
+        pending_by_model.setdefault(model_for(route), []).append(record_id)
+    for model_id, record_ids in pending_by_model.items():
+        if len(record_ids) < min_records:
+            print(f"Only {len(record_ids)} {stage} requests for {model_id} (minimum {min_records} for a batch job), using on-demand calls")
+            continue
+        with get_metrics().measure(stage):
+            batch_results = run_job(
+                backend, stage, {record_id: pending[record_id] for record_id in record_ids}, stage,
+                poll_interval=poll_interval, model_id=model_id
+            )
+        for record_id, text in batch_results.items():
+            if record_id in pending:
+                results[record_id] = text
+                if cache:
+                    cache.put(pending.pop(record_id)[0], text)
+
+    def run_on_demand(record_id):
+        cache_key, build_request, route = pending[record_id]
+        try:
+            text = invoke_model(
+                bedrock_client, build_request(), model_id=model_for(route), stage=stage.removeprefix('batch-'), route=route
+            )['content'][0]['text']
+        except Exception as e:
+            print(f"Error processing record {record_id}: {str(e)}")
+            return None
+        if cache:
+            cache.put(cache_key, text)
+        return text
+
+    if pending:
+        with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as executor:
+            results.update(zip(pending, executor.map(run_on_demand, list(pending))))
+    return results
+
+def process_documents(init_md_paths, backend=None, bedrock_client=None, min_records=BATCH_MIN_RECORDS,
+                      poll_interval=BATCH_POLL_INTERVAL, image_filter=IMAGE_FILTER_ENABLED, dedup=IMAGE_DEDUP_ENABLED,
+                      courses=None):
+    """여러 문서의 이미지 분석과 콘텐츠 개선을 배치 작업 두 개(이미지, 청크)로 처리하고 {초기 마크다운: 최종 마크다운 또는 None} 반환
+
+    courses는 {초기 마크다운: 용어집을 공유하는 과목 이름}
+    """
+    if bedrock_client is None:
+        bedrock_client = get_bedrock_client()
+    if backend is None:
+        backend = get_batch_backend(bedrock_client)
+
+    cache = get_response_cache()
+    glossary = get_glossary()
+    courses = courses or {}
+
+    # 2단계: 모든 문서의 분석할 대표 이미지를 하나의 작업으로 분석 (레코드 ID -> 문서와 같은 설명을 쓰는 이미지 목록)
+    documents = []
+    image_requests = {}
+    image_records = {}
+    for md_path in init_md_paths:
+        image_names = find_image_names(iter_lines(md_path))
+        skipped = {}
+        if image_filter:
+            image_names, skipped = filter_images(image_names)
+        image_paths, members = group_images(image_names, dedup)
+        documents.append((md_path, members, skipped))
+        for representative in members:
+            image_path = image_paths[representative]
+            try:
+                route = route_image(image_path)
+                image_bytes = image_path.read_bytes()
+            except Exception as e:
+                # 읽을 수 없는 이미지는 요청에 넣지 않고 일반 호출 경로와 같이 설명 없이 둠 (다른 이미지와 문서는 계속 처리)
+                print(f"Error analyzing image {image_path}: {str(e)}")
+                continue
+            record_id = f"IMG{len(image_requests):08d}"
+            cache_key = cache.make_key(model_for(route), image_prompt(image_path), image_bytes) if cache else None
+            image_requests[record_id] = (cache_key, lambda image_path=image_path: build_image_request(image_path), route)
+            image_records[record_id] = (md_path, members[representative])
+    print(f"Analyzing {len(image_requests)} images from {len(documents)} documents (batch inference)...")
+    image_results = run_requests(image_requests, 'batch-images', backend, bedrock_client, min_records, poll_interval)
+
+    descriptions = {md_path: {} for md_path, _, _ in documents}
+    for record_id, description in image_results.items():
+        md_path, image_names = image_records[record_id]
+        for image_name in image_names:
+            descriptions[md_path][image_name] = description
+    enhanced_paths = {
+        md_path: write_enhanced_markdown(md_path, descriptions[md_path], skipped) for md_path, _, skipped in documents
+    }
+
+    # 3단계: 모든 문서의 청크를 하나의 작업으로 개선 (레코드 ID -> 문서와 청크 인덱스)
+    # 배치 작업 사이에는 프롬프트 캐시가 유지되지 않으므로 지침을 프롬프트에 그대로 포함
+    chunk_requests = {}
+    chunk_records = {}
+    for md_path, enhanced_path in enhanced_paths.items():
+        course = courses.get(md_path) or glossary_course('.')
+        for i, chunk in enumerate(iter_chunks(iter_markdown_pages(enhanced_path))):
+            record_id = f"CHK{len(chunk_requests):08d}"
+            terms = glossary.lookup(course, chunk) if glossary else []
+            route = route_chunk(chunk)
+            cache_key = cache.make_key(model_for(route), INSTRUCTION, chunk_cache_payload(chunk, terms=terms)) if cache else None
+            chunk_requests[record_id] = (
+                cache_key, lambda chunk=chunk, terms=terms: build_chunk_request(chunk, INSTRUCTION, False, terms=terms), route
+            )
+            chunk_records[(md_path, i)] = record_id
+    print(f"Enhancing {len(chunk_requests)} chunks from {len(documents)} documents (batch inference)...")
+    chunk_results = run_requests(chunk_requests, 'batch-enhance', backend, bedrock_client, min_records, poll_interval)
+
+    # 결과를 청크 순서대로 문서별 최종 마크다운 파일과 로그 파일에 씀 (실패한 청크는 원문 유지)
+    final_paths = {}
+    for md_path, enhanced_path in enhanced_paths.items():
+        pdf_name = enhanced_path.stem.replace('-2-enhanced', '')
+        final_path = pathlib.Path(f"{pdf_name}-3-completed.md")
+        log_path = pathlib.Path(f"{pdf_name}-3-completed.log")
+        failed_indices = []
+        chunk_count = 0
+        with OrderedWriter([final_path, log_path]) as writer:
+            for i, chunk in enumerate(iter_chunks(iter_markdown_pages(enhanced_path))):
+                chunk_count += 1
+                processed_chunk = chunk_results.get(chunk_records[(md_path, i)])
+                if processed_chunk and glossary:
+                    # 용어 표기를 저장된 설명으로 바꾸고, 새로 설명한 용어는 용어집에 저장
+                    course = courses.get(md_path) or glossary_course('.')
+                    processed_chunk = glossary.expand(course, processed_chunk)
+                    glossary.learn(course, processed_chunk)
+                if not processed_chunk:
+                    failed_indices.append(i)
+                writer.write(i, processed_chunk or chunk)
+        if chunk_count and len(failed_indices) == chunk_count:
+            print(f"Error: Failed to process all chunks of {pdf_name}")
+            final_path.unlink()
+            log_path.unlink()
+            final_paths[md_path] = None
+            continue
+        if failed_indices:
+            print(f"Error: Failed to process chunks {', '.join(str(i+1) for i in failed_indices)} of {pdf_name} (original text kept)")
+        final_paths[md_path] = final_path
+    return final_paths
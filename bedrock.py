@@ -0,0 +1,136 @@
+import json
+import threading
+import time
+import boto3
+from botocore.config import Config
+from utils import estimate_tokens
+from metrics import get_metrics
+from rate_limiter import get_rate_limiter, get_error_code, is_throttling_error, throttled_dimension
+from config import (
+    BEDROCK_REGION, BEDROCK_MODEL_ID, MAX_RETRIES, MAX_CONCURRENT_REQUESTS, BEDROCK_MAX_POOL_CONNECTIONS,
+    BEDROCK_CONNECT_TIMEOUT, BEDROCK_READ_TIMEOUT, BEDROCK_RETRY_MODE, BEDROCK_MAX_ATTEMPTS
+)
+
+IMAGE_TOKEN_ESTIMATE = 1600  # 이미지 1장당 예상 입력 토큰 (최대 해상도 기준)
+
+# 모든 단계와 문서가 공유하는 동시 요청 수 제한
+_request_slots = threading.BoundedSemaphore(MAX_CONCURRENT_REQUESTS)
+
+_bedrock_client = None
+_bedrock_client_lock = threading.Lock()
+
+def get_bedrock_client():
+    """모든 단계와 문서가 공유하는 bedrock-runtime 클라이언트 반환 (연결 풀, 타임아웃, 재시도 방식은 config.py 설정)"""
+    global _bedrock_client
+    with _bedrock_client_lock:
+        if _bedrock_client is None:
+            config = Config(
+                max_pool_connections=BEDROCK_MAX_POOL_CONNECTIONS,
+                connect_timeout=BEDROCK_CONNECT_TIMEOUT,
+                read_timeout=BEDROCK_READ_TIMEOUT,
+                tcp_keepalive=True,
+                # 쓰로틀링 재시도는 invoke_model에서 하므로 botocore 재시도는 일시적인 네트워크 오류 정도로 제한
+                retries={'mode': BEDROCK_RETRY_MODE, 'total_max_attempts': BEDROCK_MAX_ATTEMPTS},
+            )
+            _bedrock_client = boto3.client(service_name='bedrock-runtime', region_name=BEDROCK_REGION, config=config)
+        return _bedrock_client
+
+def connection_stats(bedrock_client=None):
+    """공유 클라이언트의 연결 풀에서 보낸 요청 수, 새로 연 연결 수, 재사용한 연결 수 반환 (알 수 없으면 None)"""
+    bedrock_client = bedrock_client or _bedrock_client
+    try:
+        pools = bedrock_client._endpoint.http_session._manager.pools
+        requests = connections = 0
+        for key in pools.keys():
+            pool = pools[key]
+            requests += pool.num_requests
+            connections += pool.num_connections
+    except (AttributeError, KeyError):
+        return None
+    return {'requests': requests, 'connections': connections, 'reused': max(0, requests - connections)}
+
+def estimate_request_tokens(body):
+    """요청 본문의 입력 토큰과 max_tokens를 합산한 예상 토큰 수 계산"""
+    input_tokens = 0
+    for message in [{'content': body.get('system', [])}] + body.get('messages', []):
+        content = message['content']
+        if isinstance(content, str):
+            content = [{'type': 'text', 'text': content}]
+        for block in content:
+            if block.get('type') == 'image':
+                input_tokens += IMAGE_TOKEN_ESTIMATE
+            elif block.get('type') == 'text':
+                input_tokens += estimate_tokens(block['text'])
+    return input_tokens + body.get('max_tokens', 0)
+
+def get_usage_tokens(response_body):
+    """응답의 usage에서 실제 사용 토큰 수 계산"""
+    usage = response_body.get('usage')
+    if not usage:
+        return None
+    return usage.get('input_tokens', 0) + usage.get('output_tokens', 0)
+
+def read_response_stream(response):
+    """invoke_model_with_response_stream 이벤트를 모아 invoke_model과 같은 형태의 응답 본문으로 변환"""
+    texts = []
+    usage = {}
+    for event in response['body']:
+        chunk = event.get('chunk')
+        if not chunk:
+            continue
+        data = json.loads(chunk['bytes'].decode())
+        if data['type'] == 'message_start':
+            usage.update(data['message'].get('usage', {}))
+        elif data['type'] == 'content_block_delta' and data['delta'].get('type') == 'text_delta':
+            texts.append(data['delta']['text'])
+        elif data['type'] == 'message_delta':
+            usage.update(data.get('usage', {}))
+    return {'content': [{'type': 'text', 'text': ''.join(texts)}], 'usage': usage}
+
+def invoke_model(bedrock_client, body, model_id=BEDROCK_MODEL_ID, max_retries=MAX_RETRIES, stream=False, stage='other',
+                 route=None):
+    """공유 레이트 리미터를 거쳐 Bedrock 모델을 호출하고 응답 본문을 반환 (stream=True이면 스트리밍 API 사용)
+
+    호출마다 지연 시간, 재시도 횟수, 레이트 리미터/백오프 대기 시간, 토큰 사용량, 요청 크기를 stage 이름으로 기록
+    (route는 모델 라우팅 경로로, 모델 ID와 함께 기록하여 경로별로 집계)
+    """
+    limiter = get_rate_limiter()
+    request_body = json.dumps(body)
+    estimated_tokens = estimate_request_tokens(body)
+    started_at = time.monotonic()
+    throttle_wait = 0.0
+
+    def record(retries, usage=None, error=None):
+        get_metrics().record_call(
+            stage, time.monotonic() - started_at, retries, throttle_wait, usage, len(request_body.encode()), error,
+            model_id, route
+        )
+
+    for retry_count in range(max_retries + 1):
+        wait_started_at = time.monotonic()
+        limiter.acquire(estimated_tokens)
+        throttle_wait += time.monotonic() - wait_started_at
+        try:
+            with _request_slots:
+                if stream:
+                    response = bedrock_client.invoke_model_with_response_stream(modelId=model_id, body=request_body)
+                    # 스트림 도중의 쓰로틀링도 재시도할 수 있도록 try 안에서 끝까지 읽음
+                    response_body = read_response_stream(response)
+                else:
+                    response = bedrock_client.invoke_model(modelId=model_id, body=request_body)
+                    response_body = json.loads(response['body'].read().decode())
+        except Exception as e:
+            if not is_throttling_error(e) or retry_count >= max_retries:
+                record(retry_count, error=get_error_code(e) or type(e).__name__)
+                raise
+            limiter.on_throttle(throttled_dimension(e))
+            wait_time = limiter.backoff_time(retry_count)
+            print(f"{get_error_code(e)} occurred. Retrying in {wait_time:.1f} seconds... (Attempt {retry_count + 1}/{max_retries})")
+            time.sleep(wait_time)
+            throttle_wait += wait_time
+            continue
+
+        limiter.on_success(estimated_tokens, get_usage_tokens(response_body))
+        # botocore가 내부에서 재시도한 횟수도 함께 기록
+        record(retry_count + response.get('ResponseMetadata', {}).get('RetryAttempts', 0), response_body.get('usage'))
+        return response_body
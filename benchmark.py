@@ -0,0 +1,249 @@
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import pathlib
+import random
+import tempfile
+import threading
+import time
+import tracemalloc
+import numpy as np
+import pymupdf
+from PIL import Image
+from botocore.exceptions import ClientError
+from bedrock import estimate_request_tokens
+from pdf_parser import parse_pdf
+from image_analyzer import analyze_images_in_markdown
+from content_enhancer import enhance_content
+from pipeline import run_pipeline
+from batch_inference import DirectoryBatchBackend, process_documents
+import model_router
+from rate_limiter import AdaptiveRateLimiter, set_rate_limiter
+from utils import estimate_tokens
+from config import MAX_REQUESTS_PER_MINUTE, MAX_TOKENS_PER_MINUTE, FAST_MODEL_ID
+
+# 벤치마크용 합성 PDF: 이름 -> (페이지 수, 이미지 수)
+FIXTURES = {
+    'text': (10, 0),
+    'small': (4, 4),
+    'medium': (20, 12),
+    'large': (80, 40),
+}
+
+WORDS = (
+    'model training data loss gradient descent optimization parameter regularization overfitting validation '
+    'feature network layer activation weight bias learning rate batch epoch accuracy error function sample'
+).split()
+
+class FakeBedrockClient:
+    """네트워크 없이 bedrock-runtime 클라이언트를 흉내내는 벤치마크용 클라이언트
+
+    응답 지연은 latency(중앙값, 초)와 latency_sigma의 로그정규분포에 출력 토큰당 token_latency를 더해 정하고,
+    throttle_rate 확률로 ThrottlingException을 발생시킴 (model_latency의 모델은 {모델 ID: 중앙값}의 지연 사용)
+    """
+
+    def __init__(self, latency=0.2, latency_sigma=0.5, token_latency=0.0, throttle_rate=0.0, output_ratio=1.0, seed=0,
+                 model_latency=None):
+        self.latency = latency
+        self.model_latency = model_latency or {}
+        self.latency_sigma = latency_sigma
+        self.token_latency = token_latency
+        self.throttle_rate = throttle_rate
+        self.output_ratio = output_ratio
+        self.calls = 0
+        self.throttles = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _respond(self, model_id, body):
+        """요청 본문에 맞는 응답 본문 생성 (이미지 설명, 이미지 묶음의 JSON 배열, 청크 개선 결과)"""
+        latency = self.model_latency.get(model_id, self.latency)
+        with self._lock:
+            self.calls += 1
+            throttled = self._random.random() < self.throttle_rate
+            delay = self._random.lognormvariate(math.log(latency), self.latency_sigma) if latency > 0 else 0.0
+            if throttled:
+                self.throttles += 1
+        if throttled:
+            time.sleep(delay / 10)
+            raise ClientError({'Error': {'Code': 'ThrottlingException', 'Message': 'Rate exceeded'}}, 'InvokeModel')
+
+        request = json.loads(body)
+        content = request['messages'][-1]['content']
+        image_count = sum(1 for block in content if block.get('type') == 'image')
+        prompt = content[-1]['text']
+        if image_count > 1:
+            text = json.dumps(
+                [{'index': i + 1, 'description': f"Synthetic description of image {i + 1}."} for i in range(image_count)]
+            )
+        elif image_count:
+            text = "Synthetic description of a chart showing a training curve."
+        else:
+            chunk = prompt.split('<content>')[-1].split('</content>')[0].strip()
+            text = chunk[:int(len(chunk) * self.output_ratio)]
+
+        input_tokens = estimate_request_tokens(request) - request.get('max_tokens', 0)
+        output_tokens = estimate_tokens(text)
+        time.sleep(delay + output_tokens * self.token_latency)
+        return {
+            'content': [{'type': 'text', 'text': text}],
+            'usage': {'input_tokens': input_tokens, 'output_tokens': output_tokens},
+        }
+
+    def invoke_model(self, modelId, body, **kwargs):
+        response_body = self._respond(modelId, body)
+        return {'body': io.BytesIO(json.dumps(response_body).encode())}
+
+    def invoke_model_with_response_stream(self, modelId, body, **kwargs):
+        response_body = self._respond(modelId, body)
+        text = response_body['content'][0]['text']
+        events = [{'type': 'message_start', 'message': {'usage': {'input_tokens': response_body['usage']['input_tokens']}}}]
+        events += [
+            {'type': 'content_block_delta', 'delta': {'type': 'text_delta', 'text': text[i:i + 200]}}
+            for i in range(0, len(text), 200)
+        ]
+        events += [
+            {'type': 'message_delta', 'usage': {'output_tokens': response_body['usage']['output_tokens']}},
+            {'type': 'message_stop'},
+        ]
+        return {'body': [{'chunk': {'bytes': json.dumps(event).encode()}} for event in events]}
+
+def make_fixture_image(rng, width=320, height=240):
+    """이미지 필터와 중복 제거에 걸리지 않는 임의의 차트 형태 PNG 이미지 생성"""
+    x = np.linspace(0, 1, width)
+    pixels = np.full((height, width, 3), 255, dtype=np.uint8)
+    for color in rng.integers(0, 200, size=(3, 3)):
+        curve = rng.uniform(0.1, 0.9) + rng.uniform(-0.4, 0.4) * x + 0.1 * np.sin(x * rng.uniform(2, 20))
+        rows = np.clip(((1 - curve) * (height - 1)).astype(int), 0, height - 1)
+        for offset in range(-1, 2):
+            pixels[np.clip(rows + offset, 0, height - 1), np.arange(width)] = color
+    pixels = np.clip(pixels.astype(int) - rng.integers(0, 30, size=pixels.shape), 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+def make_fixture_pdf(pdf_path, pages, images, seed=0):
+    """제목, 본문, 이미지가 들어간 합성 강의 자료 PDF 생성
+
+    pymupdf4llm은 한 페이지의 가까운 이미지를 하나의 그림 영역으로 합치므로 이미지는 페이지당 최대 1개를 고르게 배치
+    """
+    rng = np.random.default_rng(seed)
+    doc = pymupdf.open()
+    for page_number in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Lecture section {page_number + 1}", fontsize=22)
+        paragraph = ' '.join(rng.choice(WORDS, size=120)).capitalize() + '.'
+        page.insert_textbox(pymupdf.Rect(72, 96, page.rect.width - 72, 320), paragraph, fontsize=11)
+        if (page_number + 1) * images // pages > page_number * images // pages:
+            rect = pymupdf.Rect(72, 340, page.rect.width - 72, page.rect.height - 72)
+            page.insert_image(rect, stream=make_fixture_image(rng), keep_proportion=True)
+    doc.save(pdf_path)
+    doc.close()
+    return pdf_path
+
+def run_stage(results, stage, client, func, *args, verbose=False, **kwargs):
+    """단계 하나를 실행하고 소요 시간, 호출 수, 쓰로틀링 수, 최대 메모리 사용량(tracemalloc 기준)을 기록"""
+    calls = client.calls
+    throttles = client.throttles
+    tracemalloc.reset_peak()
+    started_at = time.perf_counter()
+    with contextlib.redirect_stdout(None if verbose else io.StringIO()):
+        output = func(*args, **kwargs)
+    results.append({
+        'stage': stage,
+        'wall_time': time.perf_counter() - started_at,
+        'calls': client.calls - calls,
+        'throttles': client.throttles - throttles,
+        'peak_memory_mb': tracemalloc.get_traced_memory()[1] / 1024 / 1024,
+    })
+    return output
+
+def run_fixture(name, pages, images, client, pipeline=False, batch_inference=False, verbose=False):
+    """합성 PDF 하나를 실제 단계 함수로 처리하고 (Bedrock 클라이언트만 교체) 단계별 결과 반환"""
+    pdf_path = make_fixture_pdf(pathlib.Path(f"bench-{name}.pdf"), pages, images, seed=len(name) * 1000 + pages)
+    results = []
+    init_md_path = run_stage(results, 'parse', client, parse_pdf, pdf_path, verbose=verbose)
+    if batch_inference:
+        # 로컬 디렉토리 백엔드가 가짜 클라이언트로 레코드를 처리 (레코드 수와 관계없이 배치 작업으로 실행)
+        backend = DirectoryBatchBackend('batch-jobs', bedrock_client=client)
+        run_stage(results, 'batch', client, process_documents, [init_md_path], backend=backend, bedrock_client=client,
+                  min_records=0, poll_interval=0, verbose=verbose)
+    elif pipeline:
+        run_stage(results, 'pipeline', client, run_pipeline, init_md_path, bedrock_client=client, verbose=verbose)
+    else:
+        enhanced_md_path = run_stage(
+            results, 'images', client, analyze_images_in_markdown, init_md_path, bedrock_client=client, verbose=verbose
+        )
+        run_stage(results, 'enhance', client, enhance_content, enhanced_md_path, bedrock_client=client, verbose=verbose)
+    return results
+
+def print_results(all_results):
+    """픽스처와 단계별 결과 표 출력"""
+    print(f"\n{'fixture':<10}{'stage':<10}{'wall (s)':>10}{'calls':>8}{'throttles':>11}{'peak (MB)':>11}")
+    for name, results in all_results.items():
+        for result in results + [{
+            'stage': 'total',
+            'wall_time': sum(result['wall_time'] for result in results),
+            'calls': sum(result['calls'] for result in results),
+            'throttles': sum(result['throttles'] for result in results),
+            'peak_memory_mb': max(result['peak_memory_mb'] for result in results),
+        }]:
+            print(
+                f"{name:<10}{result['stage']:<10}{result['wall_time']:>10.2f}{result['calls']:>8}"
+                f"{result['throttles']:>11}{result['peak_memory_mb']:>11.1f}"
+            )
+
+def main():
+    parser = argparse.ArgumentParser(description="Bedrock을 호출하지 않는 합성 PDF 처리 벤치마크")
+    parser.add_argument('--fixtures', nargs='+', choices=list(FIXTURES), default=['small', 'medium'])
+    parser.add_argument('--latency', type=float, default=0.2, help="응답 지연 중앙값 (초)")
+    parser.add_argument('--latency-sigma', type=float, default=0.5, help="응답 지연 로그정규분포의 sigma")
+    parser.add_argument('--token-latency', type=float, default=0.0, help="출력 토큰당 추가 지연 (초)")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="ThrottlingException 발생 확률")
+    parser.add_argument('--output-ratio', type=float, default=1.0, help="청크 길이 대비 개선 결과 길이 비율")
+    parser.add_argument('--rpm', type=float, default=MAX_REQUESTS_PER_MINUTE, help="레이트 리미터 RPM 한도")
+    parser.add_argument('--tpm', type=float, default=MAX_TOKENS_PER_MINUTE, help="레이트 리미터 TPM 한도")
+    parser.add_argument('--pipeline', action='store_true', help="이미지 분석과 콘텐츠 개선을 파이프라인으로 실행")
+    parser.add_argument('--batch-inference', action='store_true', help="이미지 분석과 콘텐츠 개선을 로컬 배치 추론 작업으로 실행")
+    parser.add_argument('--routing', action='store_true', help="요청 종류와 난이도에 따라 모델을 선택 (MODEL_ROUTES)")
+    parser.add_argument('--fast-latency', type=float, help="FAST_MODEL_ID 응답 지연 중앙값 (초, 기본값은 --latency와 같음)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--verbose', action='store_true', help="단계 함수의 진행 출력 표시")
+    parser.add_argument('--json', type=pathlib.Path, help="결과를 저장할 JSON 파일 경로")
+    args = parser.parse_args()
+
+    client = FakeBedrockClient(
+        args.latency, args.latency_sigma, args.token_latency, args.throttle_rate, args.output_ratio, args.seed,
+        {FAST_MODEL_ID: args.fast_latency} if args.fast_latency is not None else None
+    )
+    model_router.MODEL_ROUTING_ENABLED = args.routing
+    # 쓰로틀링 후 대기 시간이 벤치마크를 지배하지 않도록 백오프 기준 시간을 응답 지연에 맞춤
+    set_rate_limiter(AdaptiveRateLimiter(max_rpm=args.rpm, max_tpm=args.tpm, base_wait_time=max(args.latency, 0.01)))
+    json_path = args.json.resolve() if args.json else None
+
+    # 출력 파일, 추출 이미지, 응답 캐시가 이전 실행과 섞이지 않도록 임시 디렉토리에서 실행
+    all_results = {}
+    original_dir = os.getcwd()
+    tracemalloc.start()
+    with tempfile.TemporaryDirectory(prefix='pdf-bench-') as work_dir:
+        os.chdir(work_dir)
+        try:
+            for name in args.fixtures:
+                pages, images = FIXTURES[name]
+                print(f"Benchmarking {name}: {pages} pages, {images} images")
+                all_results[name] = run_fixture(name, pages, images, client, args.pipeline, args.batch_inference, args.verbose)
+        finally:
+            os.chdir(original_dir)
+            tracemalloc.stop()
+
+    print_results(all_results)
+    if json_path:
+        json_path.write_text(json.dumps({'args': {k: str(v) for k, v in vars(args).items()}, 'results': all_results}, indent=2),
+                             encoding='utf-8')
+        print(f"Results saved: {json_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import hashlib
+import os
+import pathlib
+import threading
+from collections import OrderedDict
+from config import CACHE_ENABLED, CACHE_DIR, CACHE_MAX_BYTES
+
+class ResponseCache:
+    """모델 ID, 프롬프트, 페이로드의 해시를 키로 사용하는 디스크 기반 응답 캐시 (크기 기반 LRU 삭제)"""
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.cache_dir = pathlib.Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # 디렉토리는 시작할 때 한 번만 읽고, 이후에는 {키: 크기} LRU 인덱스와 전체 크기를 메모리에서 갱신
+        self._index = OrderedDict()
+        self.total_bytes = 0
+        self._load_index()
+
+    def _load_index(self):
+        """캐시 파일을 최근 사용 시각 순으로 인덱스에 올림"""
+        entries = []
+        for path in self.cache_dir.glob('*.txt'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, path.stem, stat.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self.total_bytes += size
+
+    @staticmethod
+    def make_key(model_id, prompt, payload):
+        """모델 ID, 프롬프트, 페이로드(이미지 바이트 또는 청크 텍스트)로 캐시 키 생성"""
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        digest = hashlib.sha256()
+        for part in (model_id.encode('utf-8'), prompt.encode('utf-8'), payload):
+            # 구분자 충돌을 막기 위해 각 부분의 길이를 함께 해시
+            digest.update(len(part).to_bytes(8, 'big'))
+            digest.update(part)
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return self.cache_dir / f"{key}.txt"
+
+    def get(self, key):
+        """캐시된 응답을 반환 (없으면 None)"""
+        path = self._path(key)
+        try:
+            value = path.read_text(encoding='utf-8')
+            # 다음 실행에서도 LRU 순서가 유지되도록 파일의 최근 사용 시각도 갱신
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+                self._remove(key)
+            return None
+        with self._lock:
+            self.hits += 1
+            if key in self._index:
+                self._index.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        """응답을 캐시에 저장하고 최대 크기를 넘으면 오래된 항목 삭제"""
+        path = self._path(key)
+        tmp_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        tmp_path.write_text(value, encoding='utf-8')
+        size = tmp_path.stat().st_size
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._remove(key)
+            self._index[key] = size
+            self.total_bytes += size
+            over_limit = self.total_bytes > self.max_bytes
+        if over_limit:
+            self.evict()
+
+    def _remove(self, key):
+        """인덱스에서 항목을 빼고 전체 크기에서 차감 (잠금을 잡은 상태에서 호출)"""
+        size = self._index.pop(key, None)
+        if size is not None:
+            self.total_bytes -= size
+
+    def evict(self):
+        """가장 오래 사용되지 않은 항목부터 삭제하여 전체 크기를 max_bytes 이하로 유지"""
+        with self._lock:
+            while self._index and self.total_bytes > self.max_bytes:
+                key, size = self._index.popitem(last=False)
+                self.total_bytes -= size
+                self._path(key).unlink(missing_ok=True)
+
+    def stats(self):
+        """캐시 적중/미스 횟수 반환"""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+def get_response_cache():
+    """공유 응답 캐시 반환 (캐시가 비활성화된 경우 None)"""
+    global _response_cache
+    if not CACHE_ENABLED:
+        return None
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = ResponseCache()
+        return _response_cache
@@ -0,0 +1,104 @@
+import json
+import os
+import pathlib
+import threading
+from utils import get_pdf_name
+from config import CHECKPOINT_DIR
+
+class Checkpoint:
+    """PDF별 단계 진행 상황(입력 해시, 완료된 이미지와 청크)을 기록하는 JSON 매니페스트"""
+
+    def __init__(self, pdf_path, checkpoint_dir=CHECKPOINT_DIR):
+        self.pdf_name = get_pdf_name(pdf_path)
+        self.checkpoint_dir = pathlib.Path(checkpoint_dir)
+        self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        self.path = self.checkpoint_dir / f"{self.pdf_name}.json"
+        self.chunk_dir = self.checkpoint_dir / f"{self.pdf_name}-chunks"
+        self._lock = threading.Lock()
+        if self.path.exists():
+            self.data = json.loads(self.path.read_text(encoding='utf-8'))
+        else:
+            self.data = {'stages': {}}
+
+    def save(self):
+        """매니페스트를 원자적으로 저장"""
+        with self._lock:
+            tmp_path = self.path.with_name(f"{self.path.name}.tmp")
+            tmp_path.write_text(json.dumps(self.data, ensure_ascii=False, indent=2), encoding='utf-8')
+            os.replace(tmp_path, self.path)
+
+    def _stage(self, name):
+        return self.data['stages'].setdefault(name, {})
+
+    def is_stage_done(self, name, input_hash):
+        """같은 입력으로 완료된 단계이고 출력 파일이 남아 있는지 확인"""
+        stage = self.data['stages'].get(name, {})
+        return (
+            stage.get('input_hash') == input_hash
+            and stage.get('completed', False)
+            and pathlib.Path(stage.get('output', '')).is_file()
+        )
+
+    def stage_output(self, name):
+        """완료된 단계의 출력 파일 경로"""
+        return pathlib.Path(self.data['stages'][name]['output'])
+
+    def start_stage(self, name, input_hash):
+        """단계 시작 (입력이 바뀌었으면 이전 진행 상황을 버림)"""
+        stage = self._stage(name)
+        if stage.get('input_hash') != input_hash:
+            self.data['stages'][name] = {'input_hash': input_hash, 'completed': False}
+            if name == 'enhance' and self.chunk_dir.exists():
+                for path in self.chunk_dir.glob('*.md'):
+                    path.unlink()
+        else:
+            stage['completed'] = False
+        self.save()
+
+    def complete_stage(self, name, input_hash, output_path):
+        """단계 완료 기록"""
+        stage = self._stage(name)
+        stage.update({'input_hash': input_hash, 'completed': True, 'output': str(output_path)})
+        self.save()
+
+    def completed_images(self):
+        """분석이 끝난 이미지와 설명"""
+        return dict(self._stage('images').get('images', {}))
+
+    def record_image(self, image_name, description):
+        """이미지 분석 결과 기록 (실패한 이미지는 다음 실행에서 다시 분석)"""
+        if not description:
+            return
+        with self._lock:
+            self._stage('images').setdefault('images', {})[image_name] = description
+        self.save()
+
+    def _chunk_path(self, index):
+        return self.chunk_dir / f"{index:05d}.md"
+
+    def completed_chunks(self):
+        """처리가 끝난 청크 인덱스"""
+        return {index for index in self._stage('enhance').get('chunks', []) if self._chunk_path(index).exists()}
+
+    def load_chunk(self, index):
+        """기록된 청크 처리 결과"""
+        return self._chunk_path(index).read_text(encoding='utf-8')
+
+    def chunk_source(self, index):
+        """청크를 기록할 때 함께 저장한 원문 해시 (없으면 None)"""
+        return self._stage('enhance').get('sources', {}).get(str(index))
+
+    def record_chunk(self, index, processed_chunk, source_hash=None):
+        """청크 처리 결과 기록 (실패한 청크는 다음 실행에서 다시 처리, source_hash는 청크 원문의 해시)"""
+        if not processed_chunk:
+            return
+        self.chunk_dir.mkdir(parents=True, exist_ok=True)
+        self._chunk_path(index).write_text(processed_chunk, encoding='utf-8')
+        with self._lock:
+            stage = self._stage('enhance')
+            chunks = stage.setdefault('chunks', [])
+            if index not in chunks:
+                chunks.append(index)
+            if source_hash:
+                stage.setdefault('sources', {})[str(index)] = source_hash
+        self.save()
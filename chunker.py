@@ -0,0 +1,177 @@
+from utils import estimate_tokens, iter_lines
+from config import CHUNK_MODE, CHUNK_SIZE, CHUNK_TOKEN_BUDGET
+
+PAGE_BREAK = '-----'  # pymupdf4llm이 페이지 끝에 넣는 구분선
+FENCE_MARKERS = ('```', '~~~', '$$')
+
+def iter_pages(lines):
+    """pymupdf4llm 페이지 구분선 기준으로 라인을 페이지별 마크다운으로 묶어 순서대로 반환 (구분선은 각 페이지 끝에 포함)"""
+    page = None
+    current = []
+    for line in lines:
+        current.append(line)
+        if line.strip() == PAGE_BREAK:
+            # 마지막 구분선 뒤의 빈 줄을 마지막 페이지에 붙일 수 있도록 완성된 페이지는 한 페이지 늦게 반환
+            if page is not None:
+                yield page
+            page = '\n'.join(current)
+            current = []
+    if page is None or any(line.strip() for line in current):
+        if page is not None:
+            yield page
+        yield '\n'.join(current)
+    elif current:
+        yield '\n'.join([page] + current)
+    else:
+        yield page
+
+def iter_markdown_pages(md_path):
+    """마크다운 파일을 한 페이지씩 읽어 반환"""
+    return iter_pages(iter_lines(md_path))
+
+def split_pages(content):
+    """pymupdf4llm 페이지 구분선 기준으로 페이지별 마크다운 목록 반환"""
+    return list(iter_pages(content.split('\n')))
+
+def split_blocks(content):
+    """마크다운을 나눌 수 없는 블록 단위로 분리 (코드/수식 블록, 표, 이미지와 설명 인용문은 하나의 블록)"""
+    blocks = []
+    current = []
+    fence = None
+
+    def flush():
+        if not current:
+            return
+        block = '\n'.join(current)
+        # 이미지 바로 뒤의 인용문(이미지 설명)은 이미지와 같은 블록으로 묶음
+        if block.lstrip().startswith('>') and blocks and blocks[-1].split('\n')[-1].lstrip().startswith('!['):
+            blocks[-1] = f"{blocks[-1]}\n\n{block}"
+        else:
+            blocks.append(block)
+        current.clear()
+
+    for line in content.split('\n'):
+        stripped = line.strip()
+        if fence:
+            current.append(line)
+            if stripped.startswith(fence):
+                fence = None
+            continue
+        marker = next((m for m in FENCE_MARKERS if stripped.startswith(m)), None)
+        if marker and not (marker == '$$' and len(stripped) > 2 and stripped.endswith('$$')):
+            fence = marker
+            current.append(line)
+            continue
+        if not stripped:
+            flush()
+            continue
+        if stripped.startswith('#') or stripped == PAGE_BREAK:
+            flush()
+            current.append(line)
+            if stripped == PAGE_BREAK:
+                flush()
+            continue
+        current.append(line)
+    flush()
+    return blocks
+
+def split_sections(blocks):
+    """블록을 제목과 페이지 구분선 기준의 섹션으로 묶음"""
+    sections = [[]]
+    for block in blocks:
+        stripped = block.strip()
+        if stripped.startswith('#') and sections[-1]:
+            sections.append([])
+        sections[-1].append(block)
+        if stripped == PAGE_BREAK:
+            sections.append([])
+    return [section for section in sections if section]
+
+def pack_chunks(sections, max_tokens=CHUNK_TOKEN_BUDGET):
+    """섹션을 토큰 예산 안에서 최대한 채워 청크로 묶음 (예산을 넘는 섹션은 블록 단위로 나눔)"""
+    chunks = []
+    current = []
+    current_tokens = 0
+    for section in sections:
+        section_text = '\n\n'.join(section)
+        units = [section_text] if estimate_tokens(section_text) <= max_tokens else section
+        for unit in units:
+            tokens = estimate_tokens(unit)
+            if current and current_tokens + tokens > max_tokens:
+                chunks.append('\n\n'.join(current))
+                current = []
+                current_tokens = 0
+            current.append(unit)
+            current_tokens += tokens
+    if current:
+        chunks.append('\n\n'.join(current))
+    return chunks
+
+def split_markdown(content, max_tokens=CHUNK_TOKEN_BUDGET):
+    """마크다운 구조(제목, 페이지 구분선, 코드/수식 블록)를 유지하며 토큰 예산 단위로 분할"""
+    return pack_chunks(split_sections(split_blocks(content)), max_tokens)
+
+class ChunkPacker:
+    """페이지 순서대로 들어오는 마크다운을 토큰 예산 단위의 청크로 묶음"""
+
+    def __init__(self, max_tokens=CHUNK_TOKEN_BUDGET):
+        self.max_tokens = max_tokens
+        self.buffer = ''
+
+    def add(self, text):
+        """텍스트를 추가하고 더 이상 커지지 않는 완성된 청크 목록 반환"""
+        self.buffer = f"{self.buffer}\n\n{text}" if self.buffer else text
+        chunks = split_markdown(self.buffer, self.max_tokens)
+        # 마지막 청크는 다음 페이지와 합쳐질 수 있으므로 예산을 채울 때까지 보류
+        self.buffer = chunks.pop() if chunks else ''
+        if estimate_tokens(self.buffer) >= self.max_tokens:
+            chunks.append(self.buffer)
+            self.buffer = ''
+        return chunks
+
+    def flush(self):
+        """남은 텍스트를 마지막 청크로 반환"""
+        chunks = [self.buffer] if self.buffer.strip() else []
+        self.buffer = ''
+        return chunks
+
+def chunk_content(content, mode=CHUNK_MODE):
+    """설정된 방식으로 내용을 청크로 나눔"""
+    if mode == 'structure':
+        return split_markdown(content)
+    return [content[i:i+CHUNK_SIZE] for i in range(0, len(content), CHUNK_SIZE)]
+
+class FixedPacker:
+    """페이지 순서대로 들어오는 내용을 CHUNK_SIZE 글자 단위의 청크로 자름 (페이지를 '\n'으로 이어 붙여 자른 것과 같음)"""
+
+    def __init__(self, chunk_size=CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.started = False
+
+    def add(self, text):
+        """텍스트를 추가하고 CHUNK_SIZE를 채운 청크 목록 반환"""
+        self.buffer += f"\n{text}" if self.started else text
+        self.started = True
+        chunks = []
+        while len(self.buffer) >= self.chunk_size:
+            chunks.append(self.buffer[:self.chunk_size])
+            self.buffer = self.buffer[self.chunk_size:]
+        return chunks
+
+    def flush(self):
+        """남은 텍스트를 마지막 청크로 반환"""
+        chunks = [self.buffer] if self.buffer else []
+        self.buffer = ''
+        return chunks
+
+def make_packer(mode=CHUNK_MODE):
+    """설정된 청크 분할 방식의 packer 생성 (add(페이지)와 flush()로 완성된 청크를 받음)"""
+    return ChunkPacker() if mode == 'structure' else FixedPacker()
+
+def iter_chunks(pages, mode=CHUNK_MODE):
+    """페이지를 순서대로 받아 설정된 방식으로 청크를 만들어 반환 (메모리에는 청크 하나 분량만 유지)"""
+    packer = make_packer(mode)
+    for page in pages:
+        yield from packer.add(page)
+    yield from packer.flush()
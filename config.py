@@ -2,13 +2,134 @@
 BEDROCK_REGION = 'us-west-2'
 #BEDROCK_MODEL_ID = 'us.anthropic.claude-3-5-sonnet-20241022-v2:0'
 BEDROCK_MODEL_ID = 'us.anthropic.claude-3-7-sonnet-20250219-v1:0'
+PROMPT_CACHING_ENABLED = True  # 콘텐츠 개선 지침을 Bedrock 프롬프트 캐시에 저장
+STREAMING_ENABLED = False  # 콘텐츠 개선에 invoke_model_with_response_stream 사용 (bedrock:InvokeModelWithResponseStream 권한 필요)
+
+# 모델 라우팅 설정 (요청 종류와 난이도에 따라 경로별 모델을 선택, 비활성화하면 모든 요청에 BEDROCK_MODEL_ID 사용)
+MODEL_ROUTING_ENABLED = False
+FAST_MODEL_ID = 'us.anthropic.claude-haiku-4-5-20251001-v1:0'  # 간단한 요청용 빠르고 저렴한 모델 (이미지 입력 지원)
+MODEL_ROUTES = {
+    'image': FAST_MODEL_ID,  # 단순한 사진, 그림 설명
+    'image-complex': BEDROCK_MODEL_ID,  # 에지 밀도가 높은 도표, 수식, 글자가 많은 이미지
+    'page': BEDROCK_MODEL_ID,  # 페이지 전체 렌더링 이미지 (페이지 내용 옮겨 적기)
+    'summary': FAST_MODEL_ID,  # 누적 요약
+    'chunk': FAST_MODEL_ID,  # 수식이 적고 짧은 청크
+    'chunk-complex': BEDROCK_MODEL_ID,  # 수식이 많거나 긴 청크
+}
+ROUTE_COMPLEX_IMAGE_EDGE_DENSITY = 0.08  # 이미지의 에지 픽셀 비율이 이 이상이면 image-complex 경로
+ROUTE_COMPLEX_CHUNK_FORMULAS = 3  # 청크의 수식 블록(LaTeX 수식, 수학 기호가 많은 줄) 수가 이 이상이면 chunk-complex 경로
+ROUTE_COMPLEX_CHUNK_CHARS = 6000  # 청크 길이(글자 수)가 이 이상이면 chunk-complex 경로
+
+# Bedrock 클라이언트 설정 (모든 단계와 문서가 하나의 클라이언트와 연결 풀을 공유)
+BEDROCK_MAX_POOL_CONNECTIONS = 16  # 연결 풀 크기 (MAX_CONCURRENT_REQUESTS 이상으로 설정)
+BEDROCK_CONNECT_TIMEOUT = 10  # 연결 타임아웃 (초)
+BEDROCK_READ_TIMEOUT = 300  # 응답 읽기 타임아웃 (초, 긴 콘텐츠 개선 응답 기준)
+BEDROCK_RETRY_MODE = 'adaptive'  # botocore 재시도 방식 ('legacy', 'standard', 'adaptive')
+BEDROCK_MAX_ATTEMPTS = 2  # botocore가 보내는 최대 시도 횟수 (쓰로틀링 재시도는 MAX_RETRIES로 별도 처리)
 
 # 파일 경로 설정
 TEMP_DIR = './temp'
+CHECKPOINT_DIR = './checkpoints'
+
+# 체크포인트 설정
+CHECKPOINT_ENABLED = True  # 재실행 시 완료된 단계, 이미지, 청크를 건너뜀
+INCREMENTAL_ENABLED = False  # 수정된 PDF를 다시 처리할 때 이전 실행과 달라진 페이지만 이미지 분석과 콘텐츠 개선 (PIPELINE_ENABLED보다 우선)
 
 # API 설정
 MAX_RETRIES = 3
 BASE_WAIT_TIME = 3
 
+# 레이트 리미터 설정 (계정의 Bedrock 쿼터에 맞게 조정)
+MAX_REQUESTS_PER_MINUTE = 50  # 계정의 RPM 한도
+MAX_TOKENS_PER_MINUTE = 200000  # 계정의 TPM 한도
+MIN_REQUESTS_PER_MINUTE = 5  # 쓰로틀링이 반복되어도 유지하는 최소 RPM (TPM은 같은 비율까지 낮춤)
+RATE_INCREASE_RATIO = 0.05  # 호출 성공 시 한도 대비 RPM/TPM 증가 비율 (한도의 5%씩 회복)
+RATE_DECREASE_FACTOR = 0.5  # 쓰로틀링 발생 시 쓰로틀링된 한도(RPM 또는 TPM)의 감소 비율
+
 # 청크 크기 설정
+CHUNK_MODE = 'structure'  # 'structure': 마크다운 구조 기준 분할, 'fixed': CHUNK_SIZE 글자 단위 분할
 CHUNK_SIZE = 500
+CHUNK_TOKEN_BUDGET = 1500  # 'structure' 모드에서 청크당 최대 입력 토큰 수
+
+# 동시 처리 설정
+MAX_IMAGE_WORKERS = 4  # 이미지 분석 동시 요청 수
+MAX_CHUNK_WORKERS = 4  # 콘텐츠 개선 동시 요청 수
+MAX_CONCURRENT_REQUESTS = 8  # 모든 단계와 문서를 합친 Bedrock 동시 요청 수
+PARSE_WORKERS = 1  # 2 이상이면 PDF 페이지 범위를 나눠 프로세스 풀에서 변환
+PARSE_SHARD_PAGES = 20  # 프로세스 풀 변환 시 샤드당 페이지 수
+MAX_BATCH_DOCUMENTS = 2  # 배치 모드에서 이미지 분석/콘텐츠 개선을 동시에 진행하는 문서 수
+PIPELINE_ENABLED = False  # 이미지 분석이 끝난 페이지부터 바로 콘텐츠 개선을 시작 (2, 3단계를 겹쳐서 실행)
+
+# 누적 요약 설정 (청크마다 앞 청크들의 요약을 함께 보내 흐름을 잇고 중복을 줄임, 배치 추론에는 적용되지 않음)
+ROLLING_CONTEXT_ENABLED = False
+CONTEXT_SUMMARY_TOKENS = 300  # 누적 요약의 최대 토큰 수
+
+# 페이지 라우팅 설정 (텍스트가 거의 없는 스캔/이미지 페이지는 페이지 전체를 한 장으로 렌더링하여 한 번에 분석)
+PAGE_ROUTING_ENABLED = True
+PAGE_RENDER_DPI = 150  # 렌더링 해상도 (MAX_IMAGE_DIMENSION, MAX_IMAGE_PIXELS를 넘지 않도록 자동으로 낮춤)
+PAGE_RENDER_MAX_TEXT_CHARS = 40  # 추출 가능한 글자 수(공백 제외)가 이보다 적은 페이지만 렌더링 대상
+PAGE_RENDER_MIN_IMAGE_COVERAGE = 0.5  # 이미지가 덮는 페이지 면적 비율이 이 이상이면 렌더링
+PAGE_RENDER_MIN_IMAGES = 4  # 이미지 조각 수가 이 이상이면 렌더링
+PAGE_RENDER_MIN_DRAWINGS = 200  # 벡터 그림 수가 이 이상이면 렌더링 (글자를 윤곽선으로 바꾼 슬라이드)
+
+# Bedrock 배치 추론 설정 (배치 모드에서 이미지 분석과 콘텐츠 개선 요청을 비동기 배치 작업으로 처리)
+BATCH_INFERENCE_ENABLED = False  # PIPELINE_ENABLED, INCREMENTAL_ENABLED보다 우선
+BATCH_BACKEND = 'bedrock'  # 'bedrock': S3와 Bedrock 배치 추론 작업, 'directory': 로컬 디렉토리 대체 백엔드 (테스트용)
+BATCH_S3_URI = 's3://my-bucket/pdf-batch'  # 입력/출력 JSONL을 올릴 S3 경로
+BATCH_ROLE_ARN = ''  # Bedrock이 S3에 접근할 때 사용하는 서비스 역할 ARN
+BATCH_LOCAL_DIR = './batch-jobs'  # 'directory' 백엔드의 작업 디렉토리
+BATCH_DIR = './batch'  # 입력 레코드 파일과 내려받은 결과 파일을 두는 디렉토리
+BATCH_MIN_RECORDS = 100  # 작업당 최소 레코드 수 (이보다 적으면 일반 호출로 처리)
+BATCH_POLL_INTERVAL = 60  # 작업 상태 확인 간격 (초)
+BATCH_JOB_TIMEOUT_HOURS = 72  # 작업 최대 실행 시간 (24-168시간)
+BATCH_PRICE_RATIO = 0.5  # 온디맨드 대비 배치 추론 토큰 단가 비율 (예상 비용 계산용)
+
+# 이미지 중복 제거 설정 (dHash 기반)
+IMAGE_DEDUP_ENABLED = True  # 거의 같은 이미지는 한 번만 분석하고 결과를 재사용
+IMAGE_HASH_SIZE = 16  # 해시 크기 (IMAGE_HASH_SIZE * IMAGE_HASH_SIZE 비트)
+IMAGE_HASH_THRESHOLD = 10  # 후보로 보는 최대 해밍 거리 (256비트 기준 약 4%)
+IMAGE_COMPARE_SIZE = 1024  # 해시가 가까운 두 이미지를 픽셀 단위로 비교할 때의 최대 긴 변 길이 (px)
+IMAGE_PIXEL_DIFF_LEVEL = 64  # 밝기 차이가 이보다 크면 다른 픽셀로 간주
+IMAGE_MAX_DIFF_RATIO = 0.000005  # 다른 픽셀 비율이 이 이하일 때만 같은 이미지로 보고 설명을 재사용 (글자 하나만 달라도 구분)
+
+# 장식용 이미지 필터 설정 (조건에 해당하는 이미지는 Bedrock에 보내지 않음)
+IMAGE_FILTER_ENABLED = True
+MIN_IMAGE_SIDE = 48  # 짧은 변이 이보다 작으면 아이콘으로 간주 (px)
+MIN_IMAGE_COLOR_STD = 4.0  # 색상 표준편차가 이보다 작으면 단색으로 간주
+MIN_IMAGE_EDGE_DENSITY = 0.002  # 에지 픽셀 비율이 이보다 작으면 그라데이션/빈 배경으로 간주
+MIN_IMAGE_ENTROPY = 0.05  # 밝기 엔트로피(bit)가 이보다 작으면 거의 빈 이미지로 간주
+IMAGE_EDGE_THRESHOLD = 24  # 에지로 판단하는 인접 픽셀 밝기 차이
+
+# 이미지 인코딩 설정
+MAX_IMAGE_DIMENSION = 1568  # 모델이 활용하는 최대 긴 변 길이 (px)
+MAX_IMAGE_PIXELS = 1150000  # 모델이 활용하는 최대 픽셀 수 (약 1.15 메가픽셀)
+JPEG_QUALITY = 85  # 사진 이미지 JPEG 품질
+LINE_ART_MAX_COLORS = 256  # 색상 수가 이 이하이면 선 그림으로 보고 PNG로 인코딩
+ENCODED_IMAGE_CACHE_BYTES = 32 * 1024 * 1024  # 메모리에 유지하는 인코딩 결과의 최대 크기 (base64 기준, 32MB)
+
+# 이미지 일괄 분석 설정
+IMAGE_BATCH_SIZE = 1  # 한 요청에 묶어 보내는 최대 이미지 수 (1이면 이미지마다 개별 요청)
+IMAGE_BATCH_MAX_BYTES = 4 * 1024 * 1024  # 한 요청에 묶는 이미지의 최대 인코딩 크기 (base64 기준)
+
+# 용어집 설정 (과목별로 생성한 용어 설명을 저장하여 다른 청크와 강의 자료에서 다시 생성하지 않음)
+GLOSSARY_ENABLED = False
+GLOSSARY_DB_PATH = './glossary.db'  # SQLite 용어집 파일
+GLOSSARY_COURSE = ''  # 용어집을 공유하는 과목 이름 (비어 있으면 PDF가 있는 디렉토리 이름)
+GLOSSARY_MAX_TERMS = 30  # 청크 요청 하나에 전달하는 이미 정의된 용어의 최대 수
+GLOSSARY_TERM_MAX_WORDS = 4  # 용어 설명에서 괄호 앞 용어로 인식하는 최대 단어 수 (예: 경사 하강법은 2단어)
+
+# 응답 캐시 설정
+CACHE_ENABLED = True
+CACHE_DIR = './cache'
+CACHE_MAX_BYTES = 200 * 1024 * 1024  # 캐시 최대 크기 (200MB)
+
+# 실행 보고서 설정
+METRICS_ENABLED = True  # 실행이 끝나면 단계별 소요 시간, 지연 시간, 토큰, 예상 비용을 보고서로 저장
+REPORT_DIR = './reports'
+INPUT_TOKEN_PRICE = 3.0  # 입력 토큰 100만 개당 가격 (USD, BEDROCK_MODEL_ID 기준)
+OUTPUT_TOKEN_PRICE = 15.0  # 출력 토큰 100만 개당 가격 (USD)
+CACHE_READ_TOKEN_PRICE = 0.3  # 프롬프트 캐시에서 읽은 입력 토큰 100만 개당 가격 (USD)
+CACHE_WRITE_TOKEN_PRICE = 3.75  # 프롬프트 캐시에 쓴 입력 토큰 100만 개당 가격 (USD)
+MODEL_PRICES = {  # 모델별 (입력, 출력, 캐시 읽기, 캐시 쓰기) 토큰 100만 개당 가격 (USD, 없는 모델은 위의 단가 사용)
+    FAST_MODEL_ID: (1.0, 5.0, 0.1, 1.25),
+}
@@ -1,64 +1,19 @@
 import pathlib
-import json
-import boto3
-from utils import wait_with_backoff
-from config import BEDROCK_REGION, BEDROCK_MODEL_ID, MAX_RETRIES, CHUNK_SIZE
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from cache import get_response_cache
+from glossary import get_glossary, glossary_course, format_definition
+from bedrock import invoke_model, get_bedrock_client
+from model_router import route_chunk, model_for
+from metrics import timed
+from chunker import iter_chunks, iter_markdown_pages
+from utils import OrderedWriter, estimate_tokens, hash_file, hash_text
+from config import (
+    MAX_CHUNK_WORKERS, PROMPT_CACHING_ENABLED, STREAMING_ENABLED,
+    CHUNK_MODE, CHUNK_SIZE, CHUNK_TOKEN_BUDGET, ROLLING_CONTEXT_ENABLED, CONTEXT_SUMMARY_TOKENS
+)
 
-def process_chunk(bedrock_client, chunk, instruction, retry_count=0):
-    """청크를 처리하고 결과를 반환"""
-    try:
-        body = {
-            "anthropic_version": "bedrock-2023-05-31",
-            "max_tokens": 8000,
-            "messages": [
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": f"""
-{instruction}
-
-노트 내용:
-<content>
-{chunk}
-</content>
-"""
-                        }
-                    ]
-                }
-            ]
-        }
-
-        response = bedrock_client.invoke_model(
-            modelId=BEDROCK_MODEL_ID,
-            body=json.dumps(body)
-        )
-        
-        response_body = json.loads(response['body'].read().decode())
-        return response_body['content'][0]['text']
-    
-    except Exception as e:
-        if "ThrottlingException" in str(e) and retry_count < MAX_RETRIES:
-            print(f"Throttling error occurred. Retrying in {2**retry_count * 3} seconds... (Attempt {retry_count + 1}/{MAX_RETRIES})")
-            wait_with_backoff(retry_count)
-            return process_chunk(bedrock_client, chunk, instruction, retry_count + 1)
-        else:
-            print(f"Error processing chunk: {str(e)}")
-            return None
-
-def enhance_content(enhanced_md_path):
-    """최종 마크다운 파일 생성"""
-    bedrock_client = boto3.client(service_name='bedrock-runtime', region_name=BEDROCK_REGION)
-    pdf_name = enhanced_md_path.stem.replace('-2-enhanced', '')
-    final_path = pathlib.Path(f"{pdf_name}-3-completed.md")
-    log_path = pathlib.Path(f"{pdf_name}-3-completed.log")
-    
-    # 향상된 마크다운 내용 읽기
-    content = enhanced_md_path.read_text(encoding='utf-8')
-    
-    # 처리 지침
-    instruction = """
+# 처리 지침
+INSTRUCTION = """
 다음 지시사항에 따라 주어진 텍스트를 개선해주세요:
 
 1. 문서의 기본 구조와 형식, 문서 전체에서 다루는 주제(context)를 유지하세요.
@@ -81,32 +36,271 @@ def enhance_content(enhanced_md_path):
 
 주의: 필요한 경우가 아니라면 원본 내용의 의미를 변경하거나 새로운 주제를 추가하지 마세요. 해당 이론은 배우는 학생을 위해 원본 내용을 더 이해하기 쉽고 풍부하게 만드는 것이 목표입니다.
 """
+
+# 앞 청크들의 누적 요약 갱신 지침
+SUMMARY_PROMPT = """아래는 강의 노트의 앞부분 요약과 이어지는 새 내용입니다.
+두 내용을 합쳐 지금까지 다룬 주제, 정의한 용어, 설명한 수식과 예시를 {max_tokens} 토큰 이내의 간결한 한국어 요약으로 갱신하세요.
+다른 설명 없이 요약만 출력하세요.
+
+<summary>
+{summary}
+</summary>
+
+<content>
+{chunk}
+</content>
+"""
+
+def build_chunk_request(chunk, instruction, prompt_caching=PROMPT_CACHING_ENABLED, context=None, terms=None):
+    """청크 처리 요청 본문 생성 (프롬프트 캐싱 사용 시 지침을 캐시 가능한 system 블록으로 분리)
+
+    context(앞 청크들의 누적 요약)와 terms(용어집에 이미 설명이 있는 용어 [(용어, 영문, 설명)])가 있으면
+    노트 내용 앞에 참고용으로 넣음 (system 블록은 모든 청크가 같도록 그대로 유지)
+    """
+    body = {
+        "anthropic_version": "bedrock-2023-05-31",
+        "max_tokens": 8000,
+    }
+    context_text = ""
+    if context:
+        context_text = f"""이전 내용 요약 (흐름을 잇고 중복을 피하는 데만 참고하고 출력하지 마세요):
+<previous_summary>
+{context}
+</previous_summary>
+
+"""
+    if terms:
+        # 이미 설명한 용어는 설명을 다시 생성하지 않고 표기만 출력하게 하여 출력 토큰을 줄이고, 표기는 저장된 설명으로 바꿈
+        known_terms = '\n'.join(f"- {format_definition(term, english, definition)}" for term, english, definition in terms)
+        context_text += f"""이미 설명한 용어 (아래 용어는 지침 3번의 설명을 새로 쓰지 말고 처음 등장하는 위치에 [[용어:용어명]] 표기만 쓰세요. 표기는 아래 설명으로 자동으로 바뀝니다):
+<known_terms>
+{known_terms}
+</known_terms>
+
+"""
+    if prompt_caching:
+        # 모든 청크 요청이 같은 지침 prefix를 공유하므로 캐시 지점을 지침 끝에 둠
+        body["system"] = [
+            {
+                "type": "text",
+                "text": instruction,
+                "cache_control": {"type": "ephemeral"}
+            }
+        ]
+        text = f"""
+{context_text}노트 내용:
+<content>
+{chunk}
+</content>
+"""
+    else:
+        text = f"""
+{instruction}
+
+{context_text}노트 내용:
+<content>
+{chunk}
+</content>
+"""
+    body["messages"] = [
+        {
+            "role": "user",
+            "content": [
+                {
+                    "type": "text",
+                    "text": text
+                }
+            ]
+        }
+    ]
+    return body
+
+def log_prompt_cache_usage(response_body):
+    """응답 usage의 프롬프트 캐시 토큰 수 출력"""
+    usage = response_body.get('usage', {})
+    cache_read = usage.get('cache_read_input_tokens', 0)
+    cache_write = usage.get('cache_creation_input_tokens', 0)
+    if cache_read or cache_write:
+        print(f"Prompt cache: {cache_read} input tokens read from cache, {cache_write} written to cache")
+
+def summarize_chunk(bedrock_client, summary, chunk, max_tokens=CONTEXT_SUMMARY_TOKENS):
+    """이전 누적 요약과 청크로 max_tokens 이내의 새 누적 요약 생성 (실패하면 이전 요약 유지)"""
+    prompt = SUMMARY_PROMPT.format(max_tokens=max_tokens, summary=summary or '(없음)', chunk=chunk)
+    model_id = model_for('summary')
+    try:
+        cache = get_response_cache()
+        cache_key = None
+        if cache:
+            cache_key = cache.make_key(model_id, SUMMARY_PROMPT, prompt)
+            cached = cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        body = {
+            "anthropic_version": "bedrock-2023-05-31",
+            "max_tokens": max_tokens,
+            "messages": [{"role": "user", "content": [{"type": "text", "text": prompt}]}]
+        }
+        response_body = invoke_model(bedrock_client, body, model_id=model_id, stage='summary', route='summary')
+        new_summary = response_body['content'][0]['text'].strip()
+        # 모델이 예산을 넘겨 답한 경우에도 다음 요청의 입력이 커지지 않도록 자름
+        if estimate_tokens(new_summary) > max_tokens:
+            new_summary = new_summary[:max_tokens * 2]
+        if cache:
+            cache.put(cache_key, new_summary)
+        return new_summary
+
+    except Exception as e:
+        print(f"Error summarizing chunk: {str(e)}")
+        return summary
+
+def chunk_cache_payload(chunk, context=None, terms=None):
+    """청크 응답 캐시 키에 쓰는 페이로드 (누적 요약이나 이미 설명한 용어가 있으면 함께 포함)"""
+    if not context and not terms:
+        return chunk
+    return '\n\n'.join([context or ''] + [format_definition(*term) for term in terms or []] + [chunk])
+
+def process_chunk(bedrock_client, chunk, instruction, stream=STREAMING_ENABLED, context=None, course=None):
+    """청크를 처리하고 결과를 반환 (context는 앞 청크들의 누적 요약, course는 용어집을 공유하는 과목 이름)
+
+    모델은 청크의 수식 밀도와 길이에 따른 라우팅 경로로 선택
+    """
+    try:
+        route = route_chunk(chunk)
+        model_id = model_for(route)
+        # 용어집에 설명이 있는 용어는 요청에 함께 보냄
+        glossary = get_glossary()
+        terms = []
+        if glossary:
+            course = course or glossary_course('.')
+            terms = glossary.lookup(course, chunk)
+
+        # 동일한 모델, 지침, 청크(와 누적 요약, 이미 설명한 용어)에 대한 응답이 캐시에 있으면 재사용
+        cache = get_response_cache()
+        cache_key = None
+        if cache:
+            cache_key = cache.make_key(model_id, instruction, chunk_cache_payload(chunk, context, terms))
+            cached = cache.get(cache_key)
+            if cached is not None:
+                # 배치 추론 경로가 저장한 응답에는 용어 표기가 남아 있을 수 있으므로 캐시에서 읽은 응답도 설명으로 바꿈
+                return glossary.expand(course, cached) if glossary else cached
+
+        body = build_chunk_request(chunk, instruction, context=context, terms=terms)
+        response_body = invoke_model(bedrock_client, body, model_id=model_id, stream=stream, stage='enhance', route=route)
+        log_prompt_cache_usage(response_body)
+        processed_chunk = response_body['content'][0]['text']
+        if glossary:
+            # 응답의 용어 표기를 저장된 설명으로 바꾸고, 새로 설명한 용어는 용어집에 저장
+            processed_chunk = glossary.expand(course, processed_chunk)
+            glossary.learn(course, processed_chunk)
+        if cache:
+            cache.put(cache_key, processed_chunk)
+        return processed_chunk
+    
+    except Exception as e:
+        print(f"Error processing chunk: {str(e)}")
+        return None
+
+def process_chunks(bedrock_client, chunks, instruction, max_workers=MAX_CHUNK_WORKERS, stream=STREAMING_ENABLED, skip=(),
+                   rolling_context=ROLLING_CONTEXT_ENABLED, course=None):
+    """청크를 동시에 처리하고 완료되는 순서대로 (청크 인덱스, 원문, 결과)를 반환 (skip의 인덱스는 제외)
+
+    chunks는 제너레이터여도 되며, 대기 중인 청크를 max_workers의 두 배까지만 꺼내 메모리 사용량을 제한
+    rolling_context=True이면 별도 스레드가 청크 순서대로 누적 요약을 만들고, 각 청크는 앞 청크까지의 요약이 준비되는 대로
+    개선 요청을 보내므로 요약 생성과 앞선 청크들의 개선 요청이 겹쳐서 실행됨
+    """
+    def finish(done):
+        for future in done:
+            i, chunk = futures.pop(future)
+            processed_chunk = future.result()
+            if not processed_chunk:
+                print(f"Error: Failed to process chunk {i+1}")
+            yield i, chunk, processed_chunk
+
+    def process_with_context(chunk, context_future):
+        return process_chunk(bedrock_client, chunk, instruction, stream, context_future.result(), course)
+
+    # 최대 max_workers 개의 요청을 동시에 유지 (누적 요약은 하나의 스레드에서 청크 순서대로 생성)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor, \
+            ThreadPoolExecutor(max_workers=1) as summary_executor:
+        futures = {}
+        summary_future = None
+        previous_chunk = None
+        for i, chunk in enumerate(chunks):
+            if rolling_context and previous_chunk is not None:
+                # 앞 청크의 요약은 다음 청크가 있을 때만 만들고, 건너뛰는 청크도 요약에 포함 (재실행 시 응답 캐시로 재사용)
+                summary_future = summary_executor.submit(
+                    lambda previous, chunk: summarize_chunk(bedrock_client, previous.result() if previous else '', chunk),
+                    summary_future, previous_chunk
+                )
+            previous_chunk = chunk
+            context_future = summary_future
+            if i in skip:
+                continue
+            if len(futures) >= max_workers * 2:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                yield from finish(done)
+            print(f"Processing chunk {i+1}...")
+            if context_future:
+                future = executor.submit(process_with_context, chunk, context_future)
+            else:
+                future = executor.submit(process_chunk, bedrock_client, chunk, instruction, stream, None, course)
+            futures[future] = (i, chunk)
+        yield from finish(as_completed(list(futures)))
+
+@timed('enhance')
+def enhance_content(enhanced_md_path, max_workers=MAX_CHUNK_WORKERS, stream=STREAMING_ENABLED, checkpoint=None, bedrock_client=None,
+                    course=None):
+    """최종 마크다운 파일 생성 (course는 용어집을 공유하는 과목 이름)"""
+    if bedrock_client is None:
+        bedrock_client = get_bedrock_client()
+    pdf_name = enhanced_md_path.stem.replace('-2-enhanced', '')
+    final_path = pathlib.Path(f"{pdf_name}-3-completed.md")
+    log_path = pathlib.Path(f"{pdf_name}-3-completed.log")
+    
+    # 향상된 마크다운을 한 페이지씩 읽어 청크로 나눔 (문서 전체를 메모리에 올리지 않음)
+    chunks = iter_chunks(iter_markdown_pages(enhanced_md_path))
     
-    # 내용을 청크로 나누기
-    chunks = [content[i:i+CHUNK_SIZE] for i in range(0, len(content), CHUNK_SIZE)]
+    # 체크포인트에 기록된 청크는 다시 처리하지 않음 (청크 분할 설정이 바뀌면 인덱스가 달라지므로 입력 해시에 포함)
+    completed = set()
+    input_hash = hash_text(f"{CHUNK_MODE}:{CHUNK_SIZE}:{CHUNK_TOKEN_BUDGET}:{hash_file(enhanced_md_path)}")
+    if checkpoint:
+        if checkpoint.is_stage_done('enhance', input_hash):
+            print("Skipping content enhancement: already completed (checkpoint)")
+            return checkpoint.stage_output('enhance')
+        checkpoint.start_stage('enhance', input_hash)
+        completed = set(checkpoint.completed_chunks())
+        if completed:
+            print(f"Skipping {len(completed)} chunks already processed (checkpoint)")
     
-    processed_chunks = []
-    for i, chunk in enumerate(chunks):
-        print(f"Processing chunk {i+1}/{len(chunks)}...")
-        processed_chunk = process_chunk(bedrock_client, chunk, instruction)
-        if processed_chunk:
-            processed_chunks.append(processed_chunk)
-        else:
-            print(f"Error: Failed to process chunk {i+1}")
+    # 청크가 완료되는 대로 청크 순서에 맞춰 최종 마크다운 파일과 로그 파일에 이어 씀 (실패한 청크는 원문 유지)
+    failed_indices = []
+    chunk_count = len(completed)
+    with OrderedWriter([final_path, log_path]) as writer:
+        for i in sorted(completed):
+            writer.write(i, checkpoint.load_chunk(i))
+        for i, chunk, processed_chunk in process_chunks(bedrock_client, chunks, INSTRUCTION, max_workers, stream, completed, course=course):
+            chunk_count += 1
+            if not processed_chunk:
+                failed_indices.append(i)
+            elif checkpoint:
+                checkpoint.record_chunk(i, processed_chunk)
+            writer.write(i, processed_chunk or chunk)
     
-    if processed_chunks:
-        # 처리된 청크 결합
-        processed_content = "\n\n".join(processed_chunks)
-        
-        # 최종 마크다운 파일 생성
-        final_path.write_text(processed_content, encoding='utf-8')
-        # 로그 파일에 전체 내용 저장
-        log_path.write_text(processed_content, encoding='utf-8')
-        print(f"Enhanced content preview:\n{processed_content[:1000]}...")  # 처리된 내용의 미리보기 길이를 1000자로 늘림
+    if len(failed_indices) < chunk_count:
+        if failed_indices:
+            print(f"Error: Failed to process chunks {', '.join(str(i+1) for i in sorted(failed_indices))} (original text kept)")
+        with final_path.open(encoding='utf-8') as f:
+            preview = f.read(1000)  # 처리된 내용의 미리보기 길이를 1000자로 늘림
+        print(f"Enhanced content preview:\n{preview}...")
         print(f"Full content saved to log file: {log_path}")
+        if checkpoint and not failed_indices:
+            checkpoint.complete_stage('enhance', input_hash, final_path)
         return final_path
     else:
         print("Error: Failed to process all chunks")
+        final_path.unlink()
+        log_path.unlink()
         return None
 
 if __name__ == "__main__":
@@ -0,0 +1,146 @@
+import functools
+import pathlib
+import re
+import sqlite3
+import threading
+import time
+from config import GLOSSARY_ENABLED, GLOSSARY_DB_PATH, GLOSSARY_COURSE, GLOSSARY_MAX_TERMS, GLOSSARY_TERM_MAX_WORDS
+
+TERM_WORD = r'[가-힣][가-힣A-Za-z0-9-]*'
+# 지침 3번 형식의 용어 설명: 인공지능(AI, Artificial Intelligence: 컴퓨터가 인간의 지능을 모방하는 기술)
+# 괄호 앞의 한글 단어를 최대 GLOSSARY_TERM_MAX_WORDS 개까지 용어 후보로 잡음 (강화 학습, 경사 하강법)
+DEFINITION_PATTERN = re.compile(
+    rf'(?<![가-힣A-Za-z0-9-])((?:{TERM_WORD} ){{0,{GLOSSARY_TERM_MAX_WORDS - 1}}}{TERM_WORD})\s?'
+    r'\(([A-Za-z][^():\n]{0,80}):\s*([^()\n]{5,300})\)'
+)
+# 용어 후보 앞쪽에서 잘라낼 단어의 끝 글자 (조사가 붙은 앞 문장의 단어: "모델은 강화 학습" -> "강화 학습")
+PARTICLE_ENDINGS = set('은는을를의에')
+# 용어 뒤에 붙어도 같은 용어로 보는 조사의 첫 글자 (강화 학습은, 강화 학습을)
+TERM_SUFFIXES = '은는이가을를의에와과로도만'
+# 이미 정의된 용어 대신 모델이 출력하는 표기: [[용어:인공지능]]
+REFERENCE_PATTERN = re.compile(r'\[\[용어:\s*([^\]]+?)\s*\]\]')
+
+def glossary_course(pdf_path):
+    """용어집을 공유하는 과목 이름 (GLOSSARY_COURSE가 비어 있으면 PDF가 있는 디렉토리 이름)"""
+    return GLOSSARY_COURSE or pathlib.Path(pdf_path).resolve().parent.name or 'default'
+
+def definition_term(candidate):
+    """괄호 앞 용어 후보에서 앞 문장에 속한 단어(조사로 끝나거나 한 글자인 단어)를 버린 용어 (한 글자 용어는 None)"""
+    words = candidate.split()
+    start = len(words) - 1
+    while start > 0 and len(words[start - 1]) > 1 and words[start - 1][-1] not in PARTICLE_ENDINGS:
+        start -= 1
+    term = ' '.join(words[start:])
+    return term if len(term) > 1 else None
+
+@functools.lru_cache(maxsize=4096)
+def term_pattern(term):
+    """다른 단어의 일부가 아닌 용어 전체와 일치하는 패턴 (한국어 용어는 뒤에 조사가 붙어도 일치)"""
+    if re.match('[가-힣]', term):
+        body = r'\s+'.join(re.escape(word) for word in term.split())
+        return re.compile(rf'(?<![가-힣A-Za-z0-9]){body}(?=[{TERM_SUFFIXES}]|[^가-힣A-Za-z0-9]|$)')
+    return re.compile(rf'(?<![A-Za-z0-9]){re.escape(term)}(?![A-Za-z0-9])', re.IGNORECASE)
+
+def format_definition(term, english, definition):
+    """지침 3번 형식으로 용어 설명 작성"""
+    return f"{term}({english}: {definition})"
+
+class Glossary:
+    """과목별로 이전에 생성한 용어 설명을 저장하는 SQLite 용어집 (같은 과목의 여러 강의 자료가 공유)"""
+
+    def __init__(self, db_path=GLOSSARY_DB_PATH):
+        self.db_path = pathlib.Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS terms (
+                    course TEXT NOT NULL,
+                    term TEXT NOT NULL,
+                    english TEXT NOT NULL,
+                    definition TEXT NOT NULL,
+                    source TEXT,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (course, term)
+                )"""
+            )
+        self._terms = {}
+        self.reused = 0
+        self.learned = 0
+
+    def terms(self, course):
+        """과목의 {용어: (영문, 설명)} (처음 조회할 때 한 번만 읽어 메모리에 유지)"""
+        with self._lock:
+            if course not in self._terms:
+                rows = self._conn.execute('SELECT term, english, definition FROM terms WHERE course = ?', (course,))
+                self._terms[course] = {term: (english, definition) for term, english, definition in rows}
+            return self._terms[course]
+
+    def lookup(self, course, text, max_terms=GLOSSARY_MAX_TERMS):
+        """텍스트에 용어 전체로 등장하는 이미 정의된 용어 목록 [(용어, 영문, 설명)] (등장 위치 순, 최대 max_terms 개)"""
+        terms = self.terms(course)
+        with self._lock:
+            items = list(terms.items())
+        found = []
+        for term, (english, definition) in items:
+            # 한국어 용어나 영문 표기(약어 제외 전체 이름) 중 하나가 등장하면 포함
+            names = [term] + [name.strip() for name in english.split(',') if len(name.strip()) > 3]
+            matches = [term_pattern(name).search(text) for name in names]
+            positions = [match.start() for match in matches if match]
+            if positions:
+                found.append((min(positions), term, english, definition))
+        return [(term, english, definition) for _, term, english, definition in sorted(found)[:max_terms]]
+
+    def expand(self, course, text):
+        """응답의 [[용어:...]] 표기를 저장된 용어 설명으로 바꿈 (모르는 용어는 용어 이름만 남김)"""
+        terms = self.terms(course)
+
+        def replace(match):
+            term = match.group(1)
+            if term not in terms:
+                return term
+            with self._lock:
+                self.reused += 1
+            return format_definition(term, *terms[term])
+
+        return REFERENCE_PATTERN.sub(replace, text)
+
+    def learn(self, course, text, source=None):
+        """응답에서 새 용어 설명을 찾아 저장하고 새로 저장한 용어 수 반환 (이미 있는 용어는 처음 설명을 유지)"""
+        terms = self.terms(course)
+        new_terms = []
+        for match in DEFINITION_PATTERN.finditer(text):
+            candidate, english, definition = (group.strip() for group in match.groups())
+            term = definition_term(candidate)
+            if term and term not in terms and term not in (new_term[0] for new_term in new_terms):
+                new_terms.append((term, english, definition))
+        if not new_terms:
+            return 0
+        with self._lock, self._conn:
+            self._conn.executemany(
+                'INSERT OR IGNORE INTO terms (course, term, english, definition, source, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+                [(course, term, english, definition, source, time.time()) for term, english, definition in new_terms]
+            )
+            for term, english, definition in new_terms:
+                terms.setdefault(term, (english, definition))
+            self.learned += len(new_terms)
+        return len(new_terms)
+
+    def stats(self):
+        """이번 실행에서 새로 저장한 용어 수와 저장된 설명으로 바꾼 횟수 반환"""
+        with self._lock:
+            return {'learned': self.learned, 'reused': self.reused}
+
+_glossary = None
+_glossary_lock = threading.Lock()
+
+def get_glossary():
+    """공유 용어집 반환 (용어집이 비활성화된 경우 None)"""
+    global _glossary
+    if not GLOSSARY_ENABLED:
+        return None
+    with _glossary_lock:
+        if _glossary is None:
+            _glossary = Glossary()
+        return _glossary
@@ -1,96 +1,334 @@
 import pathlib
 import json
-import base64
-import boto3
-from PIL import Image
-import io
-from utils import wait_with_backoff
-from config import BEDROCK_REGION, BEDROCK_MODEL_ID, MAX_RETRIES, TEMP_DIR
-
-def encode_image_to_base64(image_path):
-    """이미지 파일을 base64로 인코딩"""
-    with Image.open(image_path) as img:
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
-        buffer = io.BytesIO()
-        img.save(buffer, format='JPEG')
-        return base64.b64encode(buffer.getvalue()).decode('utf-8')
-
-def analyze_image(bedrock_client, image_path, retry_count=0):
-    """Bedrock을 사용하여 이미지 분석"""
-    try:
-        base64_image = encode_image_to_base64(image_path)
-        
-        body = {
-            "anthropic_version": "bedrock-2023-05-31",
-            "max_tokens": 1500,
-            "messages": [
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "image",
-                            "source": {
-                                "type": "base64",
-                                "media_type": "image/jpeg",
-                                "data": base64_image
-                            }
-                        },
-                        {
-                            "type": "text",
-                            "text": "이 이미지를 5문장 이내로 설명해주세요. 학술적인 내용이 포함된 경우 전문적이면서 이해하기 쉽게 설명해주세요."
-                        }
-                    ]
-                }
-            ]
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from cache import get_response_cache
+from bedrock import invoke_model, get_bedrock_client
+from metrics import timed
+from image_hash import group_similar_images
+from image_filter import classify_image
+from image_encoder import get_image_encoder
+from model_router import route_image, model_for
+from chunker import iter_markdown_pages
+from utils import hash_file, is_page_render, iter_lines
+from config import (
+    TEMP_DIR, MAX_IMAGE_WORKERS, IMAGE_DEDUP_ENABLED, IMAGE_FILTER_ENABLED,
+    IMAGE_BATCH_SIZE, IMAGE_BATCH_MAX_BYTES
+)
+
+IMAGE_PROMPT = "이 이미지를 5문장 이내로 설명해주세요. 학술적인 내용이 포함된 경우 전문적이면서 이해하기 쉽게 설명해주세요."
+IMAGE_BATCH_PROMPT = """위의 이미지 {count}개를 각각 5문장 이내로 설명해주세요. 학술적인 내용이 포함된 경우 전문적이면서 이해하기 쉽게 설명해주세요.
+다른 설명 없이 아래 형식의 JSON 배열만 출력하세요. index는 이미지 번호(1부터 시작)입니다.
+[{{"index": 1, "description": "..."}}, {{"index": 2, "description": "..."}}]"""
+PAGE_PROMPT = """이 이미지는 강의 자료 한 페이지 전체를 렌더링한 것입니다.
+페이지의 제목, 본문, 수식, 표를 빠짐없이 마크다운으로 옮겨 적고, 그림과 도표는 각각 5문장 이내로 설명해주세요. 수식은 LaTeX로 표기하세요."""
+
+def build_image_block(image_path):
+    """이미지를 요청 본문의 image 블록으로 변환"""
+    # 재시도나 같은 이미지의 재분석 시에도 인코딩은 한 번만 수행
+    base64_image, media_type = get_image_encoder().encode_image(image_path)
+    return {
+        "type": "image",
+        "source": {
+            "type": "base64",
+            "media_type": media_type,
+            "data": base64_image
         }
+    }
+
+def image_prompt(image_path):
+    """이미지 1개 분석에 사용할 프롬프트 (페이지 전체를 렌더링한 이미지는 페이지 내용을 옮겨 적도록 요청)"""
+    return PAGE_PROMPT if is_page_render(image_path) else IMAGE_PROMPT
+
+def build_image_request(image_path):
+    """이미지 1개 분석 요청 본문 생성"""
+    return {
+        "anthropic_version": "bedrock-2023-05-31",
+        "max_tokens": 4000 if is_page_render(image_path) else 1500,
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    build_image_block(image_path),
+                    {
+                        "type": "text",
+                        "text": image_prompt(image_path)
+                    }
+                ]
+            }
+        ]
+    }
 
-        response = bedrock_client.invoke_model(
-            modelId=BEDROCK_MODEL_ID,
-            body=json.dumps(body)
-        )
-        
-        response_body = json.loads(response['body'].read().decode())
-        return response_body['content'][0]['text']
+def analyze_image(bedrock_client, image_path):
+    """Bedrock을 사용하여 이미지 분석 (모델은 이미지 종류와 복잡도에 따른 라우팅 경로로 선택)"""
+    try:
+        route = route_image(image_path)
+        model_id = model_for(route)
+        # 동일한 모델, 프롬프트, 이미지에 대한 응답이 캐시에 있으면 재사용
+        cache = get_response_cache()
+        cache_key = None
+        if cache:
+            cache_key = cache.make_key(model_id, image_prompt(image_path), pathlib.Path(image_path).read_bytes())
+            cached = cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        body = build_image_request(image_path)
+        response_body = invoke_model(bedrock_client, body, model_id=model_id, stage='images', route=route)
+        description = response_body['content'][0]['text']
+        if cache:
+            cache.put(cache_key, description)
+        return description
     
     except Exception as e:
-        if "ThrottlingException" in str(e) and retry_count < MAX_RETRIES:
-            print(f"Throttling error occurred. Retrying in {2**retry_count * 3} seconds... (Attempt {retry_count + 1}/{MAX_RETRIES})")
-            wait_with_backoff(retry_count)
-            return analyze_image(bedrock_client, image_path, retry_count + 1)
+        print(f"Error analyzing image {image_path}: {str(e)}")
+        return None
+
+def parse_batch_descriptions(text, count):
+    """일괄 분석 응답에서 이미지 순서대로 설명 목록 추출 (형식이 맞지 않으면 None)"""
+    try:
+        items = json.loads(text[text.index('['):text.rindex(']') + 1])
+        descriptions = {int(item['index']): str(item['description']).strip() for item in items}
+    except (ValueError, KeyError, TypeError):
+        return None
+    if sorted(descriptions) != list(range(1, count + 1)) or not all(descriptions.values()):
+        return None
+    return [descriptions[i] for i in range(1, count + 1)]
+
+def analyze_image_batch(bedrock_client, image_paths):
+    """여러 이미지를 한 번의 요청으로 분석하여 이미지 순서대로 설명 목록 반환 (응답 해석 실패 시 이미지별 요청으로 대체)
+
+    묶음의 이미지는 모두 같은 모델로 라우팅되어야 함 (pack_image_batches 참고, 경로별 통계는 첫 이미지의 경로로 기록)
+    """
+    if len(image_paths) == 1:
+        return [analyze_image(bedrock_client, image_paths[0])]
+
+    try:
+        route = route_image(image_paths[0])
+        model_id = model_for(route)
+    except Exception as e:
+        print(f"Error routing image batch: {str(e)}")
+        return [analyze_image(bedrock_client, image_path) for image_path in image_paths]
+    # 캐시에 있는 이미지는 요청에서 제외
+    cache = get_response_cache()
+    descriptions = {}
+    cache_keys = {}
+    if cache:
+        for image_path in image_paths:
+            try:
+                cache_keys[image_path] = cache.make_key(model_id, IMAGE_PROMPT, pathlib.Path(image_path).read_bytes())
+            except Exception as e:
+                # 읽을 수 없는 이미지는 단일 이미지 분석과 같이 실패로 처리하고 나머지 이미지만 요청
+                print(f"Error analyzing image {image_path}: {str(e)}")
+                descriptions[image_path] = None
+                continue
+            cached = cache.get(cache_keys[image_path])
+            if cached is not None:
+                descriptions[image_path] = cached
+    pending_paths = [image_path for image_path in image_paths if image_path not in descriptions]
+
+    if len(pending_paths) > 1:
+        batch_descriptions = None
+        try:
+            content = []
+            for i, image_path in enumerate(pending_paths):
+                content.append({"type": "text", "text": f"이미지 {i + 1}:"})
+                content.append(build_image_block(image_path))
+            content.append({"type": "text", "text": IMAGE_BATCH_PROMPT.format(count=len(pending_paths))})
+            body = {
+                "anthropic_version": "bedrock-2023-05-31",
+                "max_tokens": min(1500 * len(pending_paths), 8000),
+                "messages": [{"role": "user", "content": content}]
+            }
+            response_body = invoke_model(bedrock_client, body, model_id=model_id, stage='images', route=route)
+            batch_descriptions = parse_batch_descriptions(response_body['content'][0]['text'], len(pending_paths))
+        except Exception as e:
+            print(f"Error analyzing image batch: {str(e)}")
+        if batch_descriptions:
+            for image_path, description in zip(pending_paths, batch_descriptions):
+                descriptions[image_path] = description
+                if cache:
+                    cache.put(cache_keys[image_path], description)
+            pending_paths = []
         else:
-            print(f"Error analyzing image {image_path}: {str(e)}")
-            return None
+            print(f"Falling back to single-image requests for {len(pending_paths)} images")
 
-def analyze_images_in_markdown(md_path):
-    """마크다운 파일의 모든 이미지 분석"""
-    bedrock_client = boto3.client(service_name='bedrock-runtime', region_name=BEDROCK_REGION)
-    content = md_path.read_text(encoding='utf-8')
-    lines = content.split('\n')
-    new_lines = []
-    analyzed_images = set()
+    for image_path in pending_paths:
+        descriptions[image_path] = analyze_image(bedrock_client, image_path)
+    return [descriptions[image_path] for image_path in image_paths]
 
+def pack_image_batches(image_paths, batch_size=IMAGE_BATCH_SIZE, max_bytes=IMAGE_BATCH_MAX_BYTES):
+    """인코딩된 크기 기준으로 이미지를 최대 batch_size 개, max_bytes 이하의 묶음으로 나눔
+
+    페이지 렌더링 이미지는 단독 요청으로 보내고, 나머지는 라우팅 경로의 모델이 같은 이미지끼리만 묶음
+    """
+    if batch_size <= 1:
+        return [[image_path] for image_path in image_paths]
+    batches = []
+    current = {}
+    current_bytes = {}
+    for image_path in image_paths:
+        if is_page_render(image_path):
+            batches.append([image_path])
+            continue
+        model_id = model_for(route_image(image_path))
+        try:
+            payload_bytes = len(get_image_encoder().encode_image(image_path)[0])
+        except Exception:
+            # 인코딩할 수 없는 이미지는 분석 단계에서 에러로 처리
+            payload_bytes = 0
+        if current.get(model_id) and (
+            len(current[model_id]) >= batch_size or current_bytes[model_id] + payload_bytes > max_bytes
+        ):
+            batches.append(current.pop(model_id))
+        current.setdefault(model_id, []).append(image_path)
+        current_bytes[model_id] = payload_bytes + (current_bytes[model_id] if len(current[model_id]) > 1 else 0)
+    batches.extend(current.values())
+    return batches
+
+def find_image_names(lines):
+    """마크다운 라인에서 이미지 파일명을 등장 순서대로 추출 (중복 제외)"""
+    image_names = []
+    for line in lines:
+        if '![' in line and '](' in line:
+            image_name = line.split('(')[-1].split(')')[0]
+            if image_name not in image_names:
+                image_names.append(image_name)
+    return image_names
+
+def filter_images(image_names):
+    """장식용 이미지를 걸러내고 (분석할 이미지 목록, {제외한 이미지: 사유})를 반환"""
+    kept_names = []
+    skipped = {}
+    for image_name in image_names:
+        image_path = pathlib.Path(TEMP_DIR) / pathlib.Path(image_name).name
+        try:
+            reason = classify_image(image_path)
+        except Exception as e:
+            # 판별할 수 없는 이미지는 그대로 분석 단계로 넘김
+            print(f"Error classifying image {image_path}: {str(e)}")
+            reason = None
+        if reason:
+            print(f"Skipping image {image_path.name}: {reason}")
+            skipped[image_name] = reason
+        else:
+            kept_names.append(image_name)
+    return kept_names, skipped
+
+def group_images(image_names, dedup=IMAGE_DEDUP_ENABLED):
+    """이미지 경로와 {대표 이미지: 같은 분석 결과를 쓰는 이미지 목록}을 반환"""
+    image_paths = {image_name: pathlib.Path(TEMP_DIR) / pathlib.Path(image_name).name for image_name in image_names}
+    # 거의 같은 이미지(로고, 반복되는 배너 등)는 대표 이미지 하나만 분석하고 결과를 공유
+    representatives = {image_name: image_name for image_name in image_names}
+    if dedup:
+        names_by_path = {path: image_name for image_name, path in image_paths.items()}
+        # 페이지 렌더링 이미지는 글자만 다른 페이지도 해시가 가까우므로 내용이 완전히 같은 경우만 묶음
+        page_names = {}
+        for image_name, path in image_paths.items():
+            if not is_page_render(path):
+                continue
+            try:
+                content_hash = hash_file(path)
+            except OSError:
+                continue
+            representatives[image_name] = page_names.setdefault(content_hash, image_name)
+        path_groups = group_similar_images([path for path in image_paths.values() if not is_page_render(path)])
+        representatives.update({names_by_path[path]: names_by_path[representative] for path, representative in path_groups.items()})
+    members = {}
+    for image_name, representative in representatives.items():
+        members.setdefault(representative, []).append(image_name)
+        if image_name != representative:
+            kind = 'identical' if is_page_render(image_paths[image_name]) else 'near-duplicate'
+            print(f"Reusing analysis of {image_paths[representative].name} for {image_paths[image_name].name} ({kind})")
+    return image_paths, members
+
+def analyze_images(bedrock_client, image_names, max_workers=MAX_IMAGE_WORKERS, on_result=None, dedup=IMAGE_DEDUP_ENABLED,
+                   batch_size=IMAGE_BATCH_SIZE):
+    """워커 풀을 사용하여 여러 이미지를 동시에 분석 (on_result는 이미지마다 완료 시 호출)"""
+    image_paths, members = group_images(image_names, dedup)
+    descriptions = {}
+    names_by_path = {image_paths[representative]: representative for representative in members}
+    batches = pack_image_batches([image_paths[representative] for representative in members], batch_size)
+    # 동시 요청 수는 워커 수로, 호출 속도는 공유 레이트 리미터로 제한
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for batch in batches:
+            print(f"Analyzing image{'s' if len(batch) > 1 else ''}: {', '.join(image_path.name for image_path in batch)}")
+            futures[executor.submit(analyze_image_batch, bedrock_client, batch)] = batch
+        for future in as_completed(futures):
+            for image_path, description in zip(futures[future], future.result()):
+                for image_name in members[names_by_path[image_path]]:
+                    descriptions[image_name] = description
+                    if on_result:
+                        on_result(image_name, description)
+    return descriptions
+
+def insert_image_descriptions(lines, descriptions, analyzed_images=None):
+    """이미지 라인 뒤에 분석 결과를 삽입 (같은 이미지는 처음 등장한 위치에만 삽입)"""
+    if analyzed_images is None:
+        analyzed_images = set()
+    new_lines = []
     for line in lines:
         new_lines.append(line)
         if '![' in line and '](' in line:
             image_name = line.split('(')[-1].split(')')[0]
             if image_name not in analyzed_images:
-                image_path = pathlib.Path(TEMP_DIR) / pathlib.Path(image_name).name
-                print(f"Analyzing image: {image_path.name}")
-                description = analyze_image(bedrock_client, image_path)
+                description = descriptions.get(image_name)
                 if description:
                     # 이미지 경로 수정
                     new_lines[-1] = f'![](./temp/{image_name})'
-                    new_lines.append(f"\n> **이미지 설명:**")
+                    new_lines.append(f"\n> **{'페이지 내용' if is_page_render(image_name) else '이미지 설명'}:**")
                     for desc_line in description.split('\n'):
                         new_lines.append(f"> {desc_line}")
                     new_lines.append("")
                 analyzed_images.add(image_name)
-                wait_with_backoff(0)  # API 쓰로틀링 방지
+    return new_lines
 
-    enhanced_content = '\n'.join(new_lines)
+def write_enhanced_markdown(md_path, descriptions, skipped=None):
+    """분석 결과를 원래 라인 순서대로 삽입하여 페이지 단위로 이어 쓰고, 제외한 이미지와 사유를 기록한 뒤 향상된 마크다운 경로 반환"""
     enhanced_path = md_path.with_name(md_path.stem.replace('-1-init', '-2-enhanced') + md_path.suffix)
-    enhanced_path.write_text(enhanced_content, encoding='utf-8')
+    analyzed_images = set()
+    with enhanced_path.open('w', encoding='utf-8') as f:
+        for page_index, page in enumerate(iter_markdown_pages(md_path)):
+            page_md = '\n'.join(insert_image_descriptions(page.split('\n'), descriptions, analyzed_images))
+            f.write(f"\n{page_md}" if page_index else page_md)
+    if skipped:
+        skipped_path = md_path.with_name(md_path.stem.replace('-1-init', '-2-skipped-images') + '.json')
+        skipped_path.write_text(json.dumps(skipped, ensure_ascii=False, indent=2), encoding='utf-8')
+        print(f"Skipped {len(skipped)} decorative images (reasons saved to {skipped_path})")
+    return enhanced_path
+
+@timed('images')
+def analyze_images_in_markdown(md_path, max_workers=MAX_IMAGE_WORKERS, checkpoint=None, bedrock_client=None,
+                               image_filter=IMAGE_FILTER_ENABLED):
+    """마크다운 파일의 모든 이미지 분석"""
+    if bedrock_client is None:
+        bedrock_client = get_bedrock_client()
+    # 마크다운은 한 줄(이미지 분석 결과 삽입 시에는 한 페이지)씩 읽어 문서 전체를 메모리에 올리지 않음
+    input_hash = hash_file(md_path)
+    image_names = find_image_names(iter_lines(md_path))
+
+    # 체크포인트에 기록된 이미지는 다시 분석하지 않음
+    descriptions = {}
+    on_result = None
+    if checkpoint:
+        if checkpoint.is_stage_done('images', input_hash):
+            print("Skipping image analysis: already completed (checkpoint)")
+            return checkpoint.stage_output('images')
+        checkpoint.start_stage('images', input_hash)
+        descriptions = {name: desc for name, desc in checkpoint.completed_images().items() if name in image_names}
+        if descriptions:
+            print(f"Skipping {len(descriptions)} images already analyzed (checkpoint)")
+        on_result = checkpoint.record_image
+    pending_names = [name for name in image_names if name not in descriptions]
+    
+    # 아이콘, 단색 막대, 빈 배경 같은 장식용 이미지는 모델을 호출하지 않음
+    skipped = {}
+    if image_filter:
+        pending_names, skipped = filter_images(pending_names)
+    descriptions.update(analyze_images(bedrock_client, pending_names, max_workers, on_result))
+    enhanced_path = write_enhanced_markdown(md_path, descriptions, skipped)
+    if checkpoint and all(descriptions.get(name) for name in image_names if name not in skipped):
+        checkpoint.complete_stage('images', input_hash, enhanced_path)
     return enhanced_path
 
 if __name__ == "__main__":
@@ -0,0 +1,93 @@
+import base64
+import io
+import pathlib
+import threading
+from collections import OrderedDict
+from PIL import Image
+from config import MAX_IMAGE_DIMENSION, MAX_IMAGE_PIXELS, JPEG_QUALITY, LINE_ART_MAX_COLORS, ENCODED_IMAGE_CACHE_BYTES
+
+class ImageEncoder:
+    """모델 최대 해상도에 맞춰 이미지를 줄이고 내용에 맞는 형식으로 한 번만 인코딩"""
+
+    def __init__(self, max_bytes=ENCODED_IMAGE_CACHE_BYTES):
+        self._encoded = OrderedDict()
+        self._lock = threading.Lock()
+        self.max_bytes = max_bytes
+        self.cached_bytes = 0
+        self.images = 0
+        self.original_bytes = 0
+        self.encoded_bytes = 0
+
+    @staticmethod
+    def resize(img):
+        """긴 변과 전체 픽셀 수가 모델 최대 해상도를 넘지 않도록 축소"""
+        scale = min(1.0, MAX_IMAGE_DIMENSION / max(img.size), (MAX_IMAGE_PIXELS / (img.width * img.height)) ** 0.5)
+        if scale < 1.0:
+            img = img.resize((max(1, int(img.width * scale)), max(1, int(img.height * scale))), Image.LANCZOS)
+        return img
+
+    @staticmethod
+    def is_line_art(img):
+        """색상 수가 적은 도표, 다이어그램, 텍스트 이미지인지 확인"""
+        return img.getcolors(maxcolors=LINE_ART_MAX_COLORS) is not None
+
+    def encode_image(self, image_path):
+        """이미지를 (base64 데이터, 미디어 타입)으로 인코딩 (같은 이미지는 실행 중 한 번만 인코딩)"""
+        key = pathlib.Path(image_path).resolve()
+        with self._lock:
+            if key in self._encoded:
+                self._encoded.move_to_end(key)
+                return self._encoded[key]
+
+        with Image.open(image_path) as img:
+            if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+                # 투명 영역은 흰 배경으로 채움
+                rgba = img.convert('RGBA')
+                img = Image.new('RGB', rgba.size, (255, 255, 255))
+                img.paste(rgba, mask=rgba.split()[-1])
+            elif img.mode != 'RGB':
+                img = img.convert('RGB')
+            # 축소할 때의 안티앨리어싱으로 색상 수가 늘어나므로 선 그림 여부는 원본으로 판단
+            line_art = self.is_line_art(img)
+            img = self.resize(img)
+
+            # 선 그림은 PNG(무손실), 사진은 JPEG로 저장
+            buffer = io.BytesIO()
+            if line_art:
+                img.save(buffer, format='PNG', optimize=True)
+                media_type = 'image/png'
+            else:
+                img.save(buffer, format='JPEG', quality=JPEG_QUALITY, optimize=True)
+                media_type = 'image/jpeg'
+        encoded = (base64.b64encode(buffer.getvalue()).decode('utf-8'), media_type)
+
+        with self._lock:
+            if key not in self._encoded:
+                self._encoded[key] = encoded
+                self.cached_bytes += len(encoded[0])
+                self.images += 1
+                self.original_bytes += key.stat().st_size
+                self.encoded_bytes += buffer.tell()
+                # 인코딩 결과는 최근 사용한 것부터 max_bytes 이하만 메모리에 유지 (방금 인코딩한 결과는 제외)
+                while self.cached_bytes > self.max_bytes and len(self._encoded) > 1:
+                    _, (data, _) = self._encoded.popitem(last=False)
+                    self.cached_bytes -= len(data)
+            else:
+                encoded = self._encoded[key]
+            return encoded
+
+    def stats(self):
+        """인코딩한 이미지 수와 원본/인코딩 바이트 수 반환"""
+        with self._lock:
+            return {
+                'images': self.images,
+                'original_bytes': self.original_bytes,
+                'encoded_bytes': self.encoded_bytes,
+                'saved_bytes': self.original_bytes - self.encoded_bytes,
+            }
+
+_image_encoder = ImageEncoder()
+
+def get_image_encoder():
+    """실행 전체에서 공유하는 이미지 인코더 반환"""
+    return _image_encoder
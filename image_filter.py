@@ -0,0 +1,42 @@
+import numpy as np
+from PIL import Image
+from config import (
+    MIN_IMAGE_SIDE, MIN_IMAGE_COLOR_STD, MIN_IMAGE_EDGE_DENSITY, MIN_IMAGE_ENTROPY, IMAGE_EDGE_THRESHOLD
+)
+
+ANALYSIS_SIZE = 256  # 통계 계산용으로 줄인 이미지의 최대 변 길이
+
+def image_statistics(img):
+    """색상 표준편차, 밝기 엔트로피, 에지 밀도 계산"""
+    img = img.convert('RGB')
+    img.thumbnail((ANALYSIS_SIZE, ANALYSIS_SIZE))
+    pixels = np.asarray(img, dtype=np.float32)
+    gray = pixels @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+    color_std = float(pixels.reshape(-1, 3).std(axis=0).max())
+
+    histogram = np.bincount(gray.astype(np.uint8).ravel(), minlength=256)
+    probabilities = histogram[histogram > 0] / gray.size
+    entropy = float(-(probabilities * np.log2(probabilities)).sum())
+
+    # 가로/세로 밝기 변화가 임계값을 넘는 픽셀 비율
+    gradient_x = np.abs(np.diff(gray, axis=1))[:-1, :]
+    gradient_y = np.abs(np.diff(gray, axis=0))[:, :-1]
+    edge_density = float(((gradient_x + gradient_y) > IMAGE_EDGE_THRESHOLD).mean()) if gradient_x.size else 0.0
+
+    return {'color_std': color_std, 'entropy': entropy, 'edge_density': edge_density}
+
+def classify_image(image_path):
+    """장식용 이미지(아이콘, 단색 막대, 빈 배경 등)이면 제외 사유를, 분석할 이미지이면 None을 반환"""
+    with Image.open(image_path) as img:
+        width, height = img.size
+        if min(width, height) < MIN_IMAGE_SIDE:
+            return f"too small ({width}x{height})"
+        stats = image_statistics(img)
+    if stats['color_std'] < MIN_IMAGE_COLOR_STD:
+        return f"solid colour (colour std {stats['color_std']:.1f})"
+    if stats['edge_density'] < MIN_IMAGE_EDGE_DENSITY:
+        return f"no visible structure (edge density {stats['edge_density']:.4f})"
+    if stats['entropy'] < MIN_IMAGE_ENTROPY:
+        return f"near-blank (entropy {stats['entropy']:.2f} bits)"
+    return None
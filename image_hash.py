@@ -0,0 +1,55 @@
+import numpy as np
+from PIL import Image
+from config import IMAGE_HASH_SIZE, IMAGE_HASH_THRESHOLD, IMAGE_COMPARE_SIZE, IMAGE_PIXEL_DIFF_LEVEL, IMAGE_MAX_DIFF_RATIO
+
+def dhash(image_path, hash_size=IMAGE_HASH_SIZE):
+    """이미지의 difference hash(dHash)를 hash_size * hash_size 비트의 bool 배열로 계산"""
+    with Image.open(image_path) as img:
+        small = img.convert('L').resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = np.asarray(small, dtype=np.int16)
+    # 가로로 인접한 픽셀의 밝기 변화 방향을 비트로 사용
+    return (pixels[:, 1:] > pixels[:, :-1]).ravel()
+
+def pixel_difference(path_a, path_b, max_side=IMAGE_COMPARE_SIZE, level=IMAGE_PIXEL_DIFF_LEVEL):
+    """두 이미지를 작은 쪽 해상도(긴 변 최대 max_side)로 맞춘 뒤 밝기 차이가 level보다 큰 픽셀 비율 계산"""
+    with Image.open(path_a) as img_a, Image.open(path_b) as img_b:
+        width, height = min(img_a.width, img_b.width), min(img_a.height, img_b.height)
+        scale = min(1.0, max_side / max(width, height))
+        size = (max(1, int(width * scale)), max(1, int(height * scale)))
+        pixels_a = np.asarray(img_a.convert('L').resize(size, Image.LANCZOS), dtype=np.int16)
+        pixels_b = np.asarray(img_b.convert('L').resize(size, Image.LANCZOS), dtype=np.int16)
+    return float((np.abs(pixels_a - pixels_b) > level).mean())
+
+def group_similar_images(image_paths, threshold=IMAGE_HASH_THRESHOLD, hash_size=IMAGE_HASH_SIZE,
+                         max_diff_ratio=IMAGE_MAX_DIFF_RATIO):
+    """해밍 거리가 threshold 이하이고 픽셀 비교에서도 같은 이미지를 묶어 {이미지 경로: 대표 이미지 경로} 반환
+
+    글자가 많은 이미지(코드, 수식, 슬라이드)는 내용이 달라도 해시가 가까우므로, 해시는 후보를 고르는 데만 쓰고
+    다른 픽셀 비율이 max_diff_ratio 이하인 대표 이미지가 있을 때만 설명을 재사용
+    """
+    groups = {}
+    representatives = []
+    representative_hashes = np.empty((0, hash_size * hash_size), dtype=bool)
+    for image_path in image_paths:
+        try:
+            image_hash = dhash(image_path, hash_size)
+        except Exception as e:
+            # 해시를 계산할 수 없는 이미지는 단독으로 분석
+            print(f"Error hashing image {image_path}: {str(e)}")
+            groups[image_path] = image_path
+            continue
+        # 모든 대표 이미지와의 해밍 거리를 한 번에 계산하고, 가까운 후보부터 픽셀 단위로 확인
+        distances = np.count_nonzero(representative_hashes != image_hash, axis=1)
+        candidates = [int(index) for index in np.argsort(distances, kind='stable') if distances[index] <= threshold]
+        representative = next(
+            (representatives[index] for index in candidates
+             if pixel_difference(image_path, representatives[index]) <= max_diff_ratio),
+            None
+        )
+        if representative is not None:
+            groups[image_path] = representative
+            continue
+        representatives.append(image_path)
+        representative_hashes = np.vstack([representative_hashes, image_hash])
+        groups[image_path] = image_path
+    return groups
@@ -0,0 +1,201 @@
+import json
+import os
+import pathlib
+import re
+from bedrock import get_bedrock_client
+from image_analyzer import find_image_names, filter_images, analyze_images, insert_image_descriptions
+from content_enhancer import process_chunks, INSTRUCTION
+from chunker import iter_markdown_pages, chunk_content
+from metrics import timed
+from utils import OrderedWriter, estimate_tokens, hash_file, hash_text
+from config import (
+    CHECKPOINT_DIR, TEMP_DIR, CHUNK_TOKEN_BUDGET, IMAGE_FILTER_ENABLED, MAX_CHUNK_WORKERS,
+    STREAMING_ENABLED
+)
+
+def page_hash(page, image_names):
+    """페이지 마크다운과 이미지 내용의 해시 (이미지 파일명은 페이지 번호를 포함하므로 이미지 내용 해시로 치환)"""
+    for image_name in image_names:
+        image_path = pathlib.Path(TEMP_DIR) / pathlib.Path(image_name).name
+        image_hash = hash_file(image_path) if image_path.is_file() else 'missing'
+        page = page.replace(image_name, image_hash)
+    return hash_text(page)
+
+def rename_images(text, renames):
+    """이전 실행의 이미지 파일명을 이번 실행의 파일명으로 한 번에 치환"""
+    renames = {old: new for old, new in renames.items() if old != new}
+    if not renames:
+        return text
+    pattern = re.compile('|'.join(re.escape(name) for name in sorted(renames, key=len, reverse=True)))
+    return pattern.sub(lambda match: renames[match.group(0)], text)
+
+def pack_page_groups(pages, max_tokens=CHUNK_TOKEN_BUDGET):
+    """연속된 페이지를 토큰 예산 안에서 묶어 [(시작 페이지, 끝 페이지)] 반환 (청크 경계는 항상 페이지 경계)"""
+    groups = []
+    start = 0
+    tokens = 0
+    for i, page in enumerate(pages):
+        page_tokens = estimate_tokens(page)
+        if i > start and tokens + page_tokens > max_tokens:
+            groups.append((start, i))
+            start = i
+            tokens = 0
+        tokens += page_tokens
+    if start < len(pages):
+        groups.append((start, len(pages)))
+    return groups
+
+class RevisionManifest:
+    """이전 실행의 페이지 묶음별 페이지 해시, 이미지, 이미지 분석 결과, 개선 결과를 기록하는 JSON 매니페스트"""
+
+    def __init__(self, pdf_name, checkpoint_dir=CHECKPOINT_DIR):
+        self.checkpoint_dir = pathlib.Path(checkpoint_dir)
+        self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        self.path = self.checkpoint_dir / f"{pdf_name}-revision.json"
+        if self.path.exists():
+            self.groups = json.loads(self.path.read_text(encoding='utf-8'))['groups']
+        else:
+            self.groups = []
+
+    def save(self, groups):
+        """이번 실행의 페이지 묶음을 원자적으로 저장"""
+        self.groups = groups
+        tmp_path = self.path.with_name(f"{self.path.name}.tmp")
+        tmp_path.write_text(json.dumps({'groups': groups}, ensure_ascii=False, indent=2), encoding='utf-8')
+        os.replace(tmp_path, self.path)
+
+    def match(self, page_hashes):
+        """페이지 해시 목록을 이전 묶음과 맞춰 [(시작, 끝, 이전 묶음 또는 None)] 반환 (None은 다시 처리할 페이지 구간)"""
+        groups_by_first_page = {}
+        for group in self.groups:
+            groups_by_first_page.setdefault(group['pages'][0], []).append(group)
+
+        plan = []
+        changed_start = None
+        i = 0
+        while i < len(page_hashes):
+            # 이번 위치부터 페이지 해시가 모두 같은 이전 묶음 중 가장 긴 것을 재사용
+            candidates = [
+                group for group in groups_by_first_page.get(page_hashes[i], [])
+                if page_hashes[i:i + len(group['pages'])] == group['pages']
+            ]
+            if candidates:
+                if changed_start is not None:
+                    plan.append((changed_start, i, None))
+                    changed_start = None
+                group = max(candidates, key=lambda group: len(group['pages']))
+                plan.append((i, i + len(group['pages']), group))
+                i += len(group['pages'])
+            else:
+                if changed_start is None:
+                    changed_start = i
+                i += 1
+        if changed_start is not None:
+            plan.append((changed_start, len(page_hashes), None))
+        return plan
+
+@timed('incremental')
+def process_incremental(init_md_path, bedrock_client=None, max_workers=MAX_CHUNK_WORKERS, stream=STREAMING_ENABLED,
+                        image_filter=IMAGE_FILTER_ENABLED, course=None):
+    """이전 실행과 달라진 페이지만 이미지 분석과 콘텐츠 개선을 다시 하고, 나머지는 이전 결과를 그대로 사용"""
+    if bedrock_client is None:
+        bedrock_client = get_bedrock_client()
+    pdf_name = init_md_path.stem.replace('-1-init', '')
+    enhanced_path = init_md_path.with_name(f"{pdf_name}-2-enhanced{init_md_path.suffix}")
+    final_path = pathlib.Path(f"{pdf_name}-3-completed.md")
+    log_path = pathlib.Path(f"{pdf_name}-3-completed.log")
+
+    pages = list(iter_markdown_pages(init_md_path))
+    page_images = [find_image_names(page.split('\n')) for page in pages]
+    page_hashes = [page_hash(page, names) for page, names in zip(pages, page_images)]
+    manifest = RevisionManifest(pdf_name)
+    plan = manifest.match(page_hashes)
+
+    reused_pages = sum(end - start for start, end, group in plan if group)
+    print(f"Incremental mode: {reused_pages}/{len(pages)} pages unchanged, {len(pages) - reused_pages} pages to process")
+
+    # 2단계: 바뀐 페이지의 이미지만 분석
+    changed_pages = [i for start, end, group in plan if not group for i in range(start, end)]
+    image_names = list(dict.fromkeys(name for i in changed_pages for name in page_images[i]))
+    if image_filter:
+        image_names, _ = filter_images(image_names)
+    descriptions = analyze_images(bedrock_client, image_names)
+    failed_images = {image_name for image_name in image_names if not descriptions.get(image_name)}
+    analyzed_images = set()
+    enhanced_pages = {
+        i: '\n'.join(insert_image_descriptions(pages[i].split('\n'), descriptions, analyzed_images)) for i in changed_pages
+    }
+
+    # 재사용할 묶음은 이전 결과의 이미지 파일명만 이번 실행의 파일명으로 바꾸고, 바뀐 구간은 페이지 경계에서 다시 묶음
+    groups = []
+    for start, end, group in plan:
+        images = [name for i in range(start, end) for name in page_images[i]]
+        if group:
+            renames = dict(zip(group['images'], images))
+            groups.append({
+                'pages': group['pages'],
+                'images': images,
+                'enhanced': [rename_images(text, renames) for text in group['enhanced']],
+                'outputs': [rename_images(text, renames) for text in group['outputs']],
+            })
+            continue
+        for group_start, group_end in pack_page_groups([enhanced_pages[i] for i in range(start, end)]):
+            page_range = range(start + group_start, start + group_end)
+            enhanced = [enhanced_pages[i] for i in page_range]
+            groups.append({
+                'pages': [page_hashes[i] for i in page_range],
+                'images': [name for i in page_range for name in page_images[i]],
+                'enhanced': enhanced,
+                # 청크는 CHUNK_MODE에 따라 나누되 묶음 단위로 나누므로 청크 경계는 항상 페이지 묶음 경계와 맞음
+                'chunks': chunk_content('\n'.join(enhanced)),
+                # 설명을 받지 못한 이미지가 있으면 다음 실행에서 다시 분석하도록 저장하지 않음
+                'failed': any(name in failed_images for i in page_range for name in page_images[i]),
+            })
+
+    enhanced_path.write_text('\n'.join(text for group in groups for text in group['enhanced']), encoding='utf-8')
+    print(f"Enhanced markdown created: {enhanced_path}")
+
+    # 3단계: 바뀐 묶음의 청크만 개선 요청 (결과는 재사용한 청크와 함께 청크 순서대로 이어 씀)
+    chunks = []
+    chunk_groups = []
+    skip = set()
+    for group in groups:
+        for text in group.get('outputs', group.get('chunks')):
+            if 'outputs' in group:
+                skip.add(len(chunks))
+            chunks.append(text)
+            chunk_groups.append(group)
+
+    failed_groups = {id(group) for group in groups if group.get('failed')}
+    failed_chunks = 0
+    with OrderedWriter([final_path, log_path]) as writer:
+        for i in sorted(skip):
+            writer.write(i, chunks[i])
+        for i, chunk, processed_chunk in process_chunks(bedrock_client, chunks, INSTRUCTION, max_workers, stream, skip, course=course):
+            group = chunk_groups[i]
+            if not processed_chunk:
+                failed_groups.add(id(group))
+                failed_chunks += 1
+            group.setdefault('processed', {})[i] = processed_chunk
+            writer.write(i, processed_chunk or chunk)
+
+    # 이미지 분석과 청크 개선이 모두 성공한 묶음만 다음 실행에서 재사용
+    manifest.save([
+        {
+            'pages': group['pages'],
+            'images': group['images'],
+            'enhanced': group['enhanced'],
+            # 청크가 없는 새 묶음(빈 페이지)은 개선 결과도 없음
+            'outputs': group.get('outputs') or [text for _, text in sorted(group.get('processed', {}).items())],
+        }
+        for group in groups if id(group) not in failed_groups
+    ])
+    if chunks and failed_chunks == len(chunks):
+        print("Error: Failed to process all chunks")
+        final_path.unlink()
+        log_path.unlink()
+        return None
+    if failed_groups:
+        print(f"Error: Failed to process {len(failed_groups)} page groups (failed images or chunks are retried on next run)")
+    print(f"Full content saved to log file: {log_path}")
+    return final_path
@@ -3,38 +3,121 @@ import pathlib
 from pdf_parser import parse_pdf
 from image_analyzer import analyze_images_in_markdown
 from content_enhancer import enhance_content
+from cache import get_response_cache
+from glossary import get_glossary, glossary_course
+from image_encoder import get_image_encoder
+from metrics import get_metrics
+from bedrock import connection_stats
+from checkpoint import Checkpoint
+from pipeline import run_pipeline
+from incremental import process_incremental
+from batch import find_pdfs, run_batch, print_batch_summary, duplicate_pdf_names, format_duplicates
+from config import CHECKPOINT_ENABLED, PIPELINE_ENABLED, INCREMENTAL_ENABLED, METRICS_ENABLED
+
+def print_run_stats(report_name):
+    """응답 캐시 적중/미스 횟수, 이미지 인코딩으로 줄인 업로드 크기, 연결 재사용 횟수, 용어집 사용량, 단계별 성능 요약 출력 및 실행 보고서 저장"""
+    cache = get_response_cache()
+    if cache:
+        stats = cache.stats()
+        print(f"Response cache: {stats['hits']} hits, {stats['misses']} misses")
+    stats = get_image_encoder().stats()
+    if stats['images']:
+        print(
+            f"Image encoding: {stats['images']} images, {stats['original_bytes'] / 1024:.0f} KB -> "
+            f"{stats['encoded_bytes'] / 1024:.0f} KB ({stats['saved_bytes'] / 1024:.0f} KB saved)"
+        )
+    stats = connection_stats()
+    if stats and stats['requests']:
+        print(f"Bedrock connections: {stats['requests']} requests over {stats['connections']} connections ({stats['reused']} reused)")
+    glossary = get_glossary()
+    if glossary:
+        stats = glossary.stats()
+        print(f"Glossary: {stats['learned']} new terms saved, {stats['reused']} definitions reused")
+    if METRICS_ENABLED:
+        metrics = get_metrics()
+        print("Performance summary:")
+        metrics.print_summary()
+        print(f"Performance report saved: {metrics.write_report(report_name)} (.csv)")
+
+def run_batch_mode(pdf_paths):
+    """여러 PDF를 배치 모드로 처리"""
+    print(f"Batch mode: processing {len(pdf_paths)} PDF files...")
+    try:
+        with get_metrics().measure_run():
+            summaries = run_batch(pdf_paths)
+        print_batch_summary(summaries)
+    finally:
+        print_run_stats('batch')
+    if any(summary['status'] != 'completed' for summary in summaries):
+        sys.exit(1)
 
 def main():
     if len(sys.argv) != 2:
-        print("Usage: python main.py <pdf_file>")
+        print("Usage: python main.py <pdf_file|directory|glob>")
         sys.exit(1)
     
     pdf_path = pathlib.Path(sys.argv[1])
-    if not pdf_path.exists():
-        print(f"Error: File {pdf_path} does not exist")
-        sys.exit(1)
+    if not pdf_path.is_file():
+        # 디렉토리나 glob 패턴이면 배치 모드로 처리
+        pdf_paths = find_pdfs(sys.argv[1])
+        if not pdf_paths:
+            print(f"Error: File {pdf_path} does not exist")
+            sys.exit(1)
+        # 출력 파일과 체크포인트가 PDF 파일 이름 기준이므로 이름이 같은 PDF는 서로의 결과를 덮어씀
+        duplicates = duplicate_pdf_names(pdf_paths)
+        if duplicates:
+            print(f"Error: PDF files with the same name cannot be processed together: {format_duplicates(duplicates)}")
+            sys.exit(1)
+        run_batch_mode(pdf_paths)
+        return
+    
+    # 이전 실행의 체크포인트가 있으면 완료된 단계와 작업은 건너뜀
+    checkpoint = Checkpoint(pdf_path) if CHECKPOINT_ENABLED else None
+    # 같은 과목(디렉토리)의 강의 자료는 용어집을 공유
+    course = glossary_course(pdf_path)
     
     try:
-        # 1. PDF 파싱
-        print("Step 1: Parsing PDF...")
-        init_md_path = parse_pdf(pdf_path)
-        print(f"Initial markdown created: {init_md_path}")
+        # 단계가 겹쳐 실행될 수 있으므로 실행 전체 경과 시간은 한 번에 측정
+        with get_metrics().measure_run():
+            # 1. PDF 파싱
+            print("Step 1: Parsing PDF...")
+            init_md_path = parse_pdf(pdf_path, checkpoint=checkpoint)
+            print(f"Initial markdown created: {init_md_path}")
+        
+            if INCREMENTAL_ENABLED:
+                # 2, 3. 이전 실행과 달라진 페이지만 다시 처리
+                print("\nStep 2-3: Re-processing changed pages (incremental)...")
+                final_md_path = process_incremental(init_md_path, course=course)
+                print(f"Final markdown created: {final_md_path}")
+                print("\nProcess completed successfully!")
+                return
         
-        # 2. 이미지 분석
-        print("\nStep 2: Analyzing images...")
-        enhanced_md_path = analyze_images_in_markdown(init_md_path)
-        print(f"Enhanced markdown created: {enhanced_md_path}")
+            if PIPELINE_ENABLED:
+                # 2, 3. 이미지 분석이 끝난 페이지부터 콘텐츠 개선
+                print("\nStep 2-3: Analyzing images and enhancing content (pipelined)...")
+                final_md_path = run_pipeline(init_md_path, checkpoint=checkpoint, course=course)
+                print(f"Final markdown created: {final_md_path}")
+                print("\nProcess completed successfully!")
+                return
         
-        # 3. 콘텐츠 개선
-        print("\nStep 3: Enhancing content...")
-        final_md_path = enhance_content(enhanced_md_path)
-        print(f"Final markdown created: {final_md_path}")
+            # 2. 이미지 분석
+            print("\nStep 2: Analyzing images...")
+            enhanced_md_path = analyze_images_in_markdown(init_md_path, checkpoint=checkpoint)
+            print(f"Enhanced markdown created: {enhanced_md_path}")
         
-        print("\nProcess completed successfully!")
+            # 3. 콘텐츠 개선
+            print("\nStep 3: Enhancing content...")
+            final_md_path = enhance_content(enhanced_md_path, checkpoint=checkpoint, course=course)
+            print(f"Final markdown created: {final_md_path}")
+        
+            print("\nProcess completed successfully!")
     
     except Exception as e:
         print(f"Error: {str(e)}")
         sys.exit(1)
+    
+    finally:
+        print_run_stats(pdf_path.stem)
 
 if __name__ == "__main__":
     main()
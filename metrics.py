@@ -0,0 +1,220 @@
+import csv
+import functools
+import json
+import pathlib
+import threading
+import time
+from contextlib import contextmanager
+from config import (
+    REPORT_DIR, INPUT_TOKEN_PRICE, OUTPUT_TOKEN_PRICE, CACHE_READ_TOKEN_PRICE, CACHE_WRITE_TOKEN_PRICE, BATCH_PRICE_RATIO,
+    MODEL_PRICES
+)
+
+CSV_FIELDS = [
+    'stage', 'calls', 'errors', 'retries', 'throttle_wait', 'input_tokens', 'output_tokens', 'cache_read_tokens',
+    'cache_write_tokens', 'payload_bytes', 'latency_total', 'latency_p50', 'latency_p95', 'wall_time', 'cost'
+]
+
+def percentile(values, ratio):
+    """정렬된 값 목록의 nearest-rank 백분위수"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, int(round(ratio * len(values))) - 1))]
+
+def estimate_cost(input_tokens, output_tokens, cache_read_tokens=0, cache_write_tokens=0, model_id=None):
+    """토큰 수와 config.py의 단가(100만 토큰당 USD, MODEL_PRICES에 있는 모델은 모델별 단가)로 예상 비용 계산"""
+    input_price, output_price, cache_read_price, cache_write_price = MODEL_PRICES.get(
+        model_id, (INPUT_TOKEN_PRICE, OUTPUT_TOKEN_PRICE, CACHE_READ_TOKEN_PRICE, CACHE_WRITE_TOKEN_PRICE)
+    )
+    return (
+        input_tokens * input_price + output_tokens * output_price
+        + cache_read_tokens * cache_read_price + cache_write_tokens * cache_write_price
+    ) / 1_000_000
+
+def call_cost(call):
+    """호출 1건의 예상 비용 (배치 추론 단계는 BATCH_PRICE_RATIO 할인 적용)"""
+    cost = estimate_cost(
+        call['input_tokens'], call['output_tokens'], call['cache_read_tokens'], call['cache_write_tokens'], call.get('model')
+    )
+    return cost * (BATCH_PRICE_RATIO if call['stage'].startswith('batch-') else 1)
+
+class MetricsRecorder:
+    """Bedrock 호출과 단계별 소요 시간을 기록하고 실행 보고서를 작성"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = []
+        self.stage_times = {}
+        self.run_time = None
+        self.started_at = time.time()
+
+    def record_call(self, stage, latency, retries=0, throttle_wait=0.0, usage=None, payload_bytes=0, error=None, model=None,
+                    route=None):
+        """Bedrock 호출 1건 기록 (latency와 throttle_wait는 초 단위, usage는 응답의 usage, route는 모델 라우팅 경로)"""
+        usage = usage or {}
+        call = {
+            'stage': stage,
+            'route': route,
+            'model': model,
+            'latency': latency,
+            'retries': retries,
+            'throttle_wait': throttle_wait,
+            'input_tokens': usage.get('input_tokens', 0),
+            'output_tokens': usage.get('output_tokens', 0),
+            'cache_read_tokens': usage.get('cache_read_input_tokens', 0),
+            'cache_write_tokens': usage.get('cache_creation_input_tokens', 0),
+            'payload_bytes': payload_bytes,
+            'error': error,
+        }
+        with self._lock:
+            self.calls.append(call)
+
+    def record_stage(self, stage, seconds):
+        """단계 전체 소요 시간 누적"""
+        with self._lock:
+            self.stage_times[stage] = self.stage_times.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def measure(self, stage):
+        """with 블록 실행 시간을 단계 소요 시간으로 기록"""
+        started_at = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record_stage(stage, time.monotonic() - started_at)
+
+    @contextmanager
+    def measure_run(self):
+        """with 블록 실행 시간을 실행 전체 소요 시간으로 기록 (단계가 겹쳐 실행되므로 total 행은 단계 합계 대신 이 값을 사용)"""
+        started_at = time.monotonic()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.run_time = (self.run_time or 0.0) + time.monotonic() - started_at
+
+    def summary(self):
+        """단계별 호출 수, 재시도, 쓰로틀링 대기, 토큰, 지연 시간 백분위수, 예상 비용 집계"""
+        with self._lock:
+            calls = list(self.calls)
+            stage_times = dict(self.stage_times)
+            run_time = self.run_time
+        stages = {}
+        for stage in list(stage_times) + [call['stage'] for call in calls]:
+            stages.setdefault(stage, {field: 0 for field in CSV_FIELDS[1:]})
+        latencies = {}
+        for call in calls:
+            totals = stages[call['stage']]
+            totals['calls'] += 1
+            totals['errors'] += 1 if call['error'] else 0
+            for field in ('retries', 'throttle_wait', 'input_tokens', 'output_tokens', 'cache_read_tokens',
+                          'cache_write_tokens', 'payload_bytes'):
+                totals[field] += call[field]
+            totals['latency_total'] += call['latency']
+            # 단계 안에서도 호출마다 모델이 다를 수 있으므로 비용은 호출별로 계산하여 합산
+            totals['cost'] += call_cost(call)
+            latencies.setdefault(call['stage'], []).append(call['latency'])
+        for stage, totals in stages.items():
+            values = sorted(latencies.get(stage, []))
+            totals['latency_p50'] = percentile(values, 0.5)
+            totals['latency_p95'] = percentile(values, 0.95)
+            totals['wall_time'] = stage_times.get(stage, 0.0)
+
+        all_latencies = sorted(call['latency'] for call in calls)
+        total = {field: sum(totals[field] for totals in stages.values()) for field in CSV_FIELDS[1:]}
+        total['latency_p50'] = percentile(all_latencies, 0.5)
+        total['latency_p95'] = percentile(all_latencies, 0.95)
+        # 파이프라인과 배치 모드에서는 단계가 겹치므로 단계별 소요 시간의 합 대신 실제 경과 시간을 사용
+        total['wall_time'] = run_time if run_time is not None else time.time() - self.started_at
+        return {'stages': stages, 'total': total, 'routes': self.route_summary(calls)}
+
+    def route_summary(self, calls=None):
+        """모델 라우팅 경로별 모델, 호출 수, 토큰, 지연 시간 백분위수, 예상 비용 집계 (경로가 기록된 호출만)"""
+        if calls is None:
+            with self._lock:
+                calls = list(self.calls)
+        routes = {}
+        latencies = {}
+        for call in calls:
+            if not call.get('route'):
+                continue
+            totals = routes.setdefault(call['route'], {'models': [], **{field: 0 for field in CSV_FIELDS[1:]}})
+            if call['model'] not in totals['models']:
+                totals['models'].append(call['model'])
+            totals['calls'] += 1
+            totals['errors'] += 1 if call['error'] else 0
+            for field in ('retries', 'throttle_wait', 'input_tokens', 'output_tokens', 'cache_read_tokens',
+                          'cache_write_tokens', 'payload_bytes'):
+                totals[field] += call[field]
+            totals['latency_total'] += call['latency']
+            totals['cost'] += call_cost(call)
+            # 배치 추론 레코드는 개별 지연 시간이 없으므로 백분위수에서 제외
+            if not call['stage'].startswith('batch-'):
+                latencies.setdefault(call['route'], []).append(call['latency'])
+        for route, totals in routes.items():
+            values = sorted(latencies.get(route, []))
+            totals['latency_p50'] = percentile(values, 0.5)
+            totals['latency_p95'] = percentile(values, 0.95)
+        return routes
+
+    def write_report(self, name, report_dir=REPORT_DIR):
+        """실행 보고서를 JSON(단계별 집계와 호출 목록)과 CSV(단계별 집계)로 저장하고 JSON 경로 반환"""
+        report_dir = pathlib.Path(report_dir)
+        report_dir.mkdir(parents=True, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(self.started_at))
+        json_path = report_dir / f"{name}-{stamp}.json"
+        csv_path = json_path.with_suffix('.csv')
+
+        summary = self.summary()
+        with self._lock:
+            calls = list(self.calls)
+        report = {'name': name, 'started_at': self.started_at, 'elapsed': time.time() - self.started_at, **summary,
+                  'calls': calls}
+        json_path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+        with csv_path.open('w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+            writer.writeheader()
+            for stage, totals in list(summary['stages'].items()) + [('total', summary['total'])]:
+                writer.writerow({'stage': stage, **totals})
+            # 모델 라우팅 경로별 집계는 route:{경로} 행으로 기록
+            for route, totals in summary['routes'].items():
+                writer.writerow({'stage': f"route:{route}", **{field: totals[field] for field in CSV_FIELDS[1:]}})
+        return json_path
+
+    def print_summary(self):
+        """단계별 소요 시간, 호출 수, 지연 시간, 예상 비용 출력"""
+        summary = self.summary()
+        for stage, totals in list(summary['stages'].items()) + [('total', summary['total'])]:
+            line = f"  {stage}: {totals['wall_time']:.1f}s"
+            if totals['calls']:
+                line += (
+                    f", {totals['calls']} calls ({totals['errors']} errors, {totals['retries']} retries, "
+                    f"{totals['throttle_wait']:.1f}s throttled), p50 {totals['latency_p50']:.1f}s, "
+                    f"p95 {totals['latency_p95']:.1f}s, {totals['input_tokens']}/{totals['output_tokens']} tokens, "
+                    f"${totals['cost']:.4f}"
+                )
+            print(line)
+        if summary['routes']:
+            print("  Model routes:")
+        for route, totals in summary['routes'].items():
+            print(
+                f"    {route} -> {', '.join(totals['models'])}: {totals['calls']} calls ({totals['errors']} errors), "
+                f"p50 {totals['latency_p50']:.1f}s, p95 {totals['latency_p95']:.1f}s, "
+                f"{totals['input_tokens']}/{totals['output_tokens']} tokens, ${totals['cost']:.4f}"
+            )
+
+_metrics = MetricsRecorder()
+
+def get_metrics():
+    """실행 전체에서 공유하는 메트릭 기록기 반환"""
+    return _metrics
+
+def timed(stage):
+    """함수 실행 시간을 단계 소요 시간으로 기록하는 데코레이터"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with get_metrics().measure(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,58 @@
+import functools
+import re
+from PIL import Image
+from image_filter import image_statistics
+from utils import is_page_render
+from config import (
+    BEDROCK_MODEL_ID, MODEL_ROUTING_ENABLED, MODEL_ROUTES, ROUTE_COMPLEX_IMAGE_EDGE_DENSITY, ROUTE_COMPLEX_CHUNK_FORMULAS,
+    ROUTE_COMPLEX_CHUNK_CHARS
+)
+
+# LaTeX 수식 블록 ($$...$$, \[...\], \(...\), $...$, equation/align 환경)
+FORMULA_PATTERN = re.compile(
+    r'\$\$.+?\$\$|\\\[.+?\\\]|\\\(.+?\\\)|(?<![\\$])\$[^$\n]+?\$|\\begin\{(?:equation|align|gather)\*?\}',
+    re.DOTALL
+)
+# PDF에서 추출한 수식에 남는 수학 기호와 그리스 문자
+MATH_SYMBOLS = set('∑∏∫∂∇√∞≈≠≤≥±×÷∈∉⊂⊆∪∩∀∃→⇒⇔αβγδεθλμπσφψωΣΠΔΩ')
+MATH_LINE_MIN_SYMBOLS = 3  # 수학 기호가 이 개수 이상인 줄은 수식 한 줄로 셈
+
+def model_for(route):
+    """경로에 해당하는 모델 ID (라우팅이 비활성화되었거나 경로가 표에 없으면 BEDROCK_MODEL_ID)"""
+    if not MODEL_ROUTING_ENABLED:
+        return BEDROCK_MODEL_ID
+    return MODEL_ROUTES.get(route, BEDROCK_MODEL_ID)
+
+@functools.lru_cache(maxsize=1024)
+def image_complexity(image_path):
+    """이미지 복잡도 점수 (에지 픽셀 비율, 같은 이미지는 한 번만 계산)"""
+    with Image.open(image_path) as img:
+        return image_statistics(img)['edge_density']
+
+def route_image(image_path):
+    """이미지 분석 요청의 경로 (페이지 렌더링은 page, 복잡도가 높으면 image-complex, 그 외 image)"""
+    if is_page_render(image_path):
+        return 'page'
+    if not MODEL_ROUTING_ENABLED:
+        # 모든 경로가 같은 모델이므로 이미지를 열어 복잡도를 계산하지 않음
+        return 'image'
+    try:
+        complexity = image_complexity(str(image_path))
+    except Exception:
+        # 열 수 없는 이미지는 강한 모델로 보내고 분석 단계에서 에러로 처리
+        return 'image-complex'
+    return 'image-complex' if complexity >= ROUTE_COMPLEX_IMAGE_EDGE_DENSITY else 'image'
+
+def math_density(chunk):
+    """청크의 수식 블록 수 (LaTeX 수식과 수학 기호가 많은 줄)"""
+    formulas = len(FORMULA_PATTERN.findall(chunk))
+    math_lines = sum(
+        1 for line in chunk.split('\n') if sum(1 for char in line if char in MATH_SYMBOLS) >= MATH_LINE_MIN_SYMBOLS
+    )
+    return formulas + math_lines
+
+def route_chunk(chunk):
+    """청크 개선 요청의 경로 (수식이 많거나 길면 chunk-complex, 그 외 chunk)"""
+    if len(chunk) >= ROUTE_COMPLEX_CHUNK_CHARS or math_density(chunk) >= ROUTE_COMPLEX_CHUNK_FORMULAS:
+        return 'chunk-complex'
+    return 'chunk'
@@ -1,25 +1,166 @@
+import json
+import math
+import os
 import pathlib
 import shutil
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pymupdf
 import pymupdf4llm
-from utils import create_temp_dir, get_pdf_name
-from config import TEMP_DIR
+from pymupdf4llm.helpers.pymupdf_rag import IdentifyHeaders
+from metrics import timed
+from utils import create_temp_dir, get_pdf_name, hash_file, PAGE_RENDER_SUFFIX
+from config import (
+    TEMP_DIR, PARSE_WORKERS, PARSE_SHARD_PAGES, MAX_IMAGE_DIMENSION, MAX_IMAGE_PIXELS, PAGE_ROUTING_ENABLED,
+    PAGE_RENDER_DPI, PAGE_RENDER_MAX_TEXT_CHARS, PAGE_RENDER_MIN_IMAGE_COVERAGE, PAGE_RENDER_MIN_IMAGES,
+    PAGE_RENDER_MIN_DRAWINGS
+)
 
-def parse_pdf(pdf_path):
+def box_coverage(boxes, rect):
+    """페이지 안으로 잘라낸 사각형 (x0, y0, x1, y1) 배열의 면적 합을 페이지 면적 비율로 반환 (겹치는 영역은 중복 계산, 최대 1)"""
+    if not len(boxes) or rect.is_empty:
+        return 0.0
+    boxes = np.asarray(boxes, dtype=float)
+    widths = np.clip(np.minimum(boxes[:, 2], rect.x1) - np.maximum(boxes[:, 0], rect.x0), 0, None)
+    heights = np.clip(np.minimum(boxes[:, 3], rect.y1) - np.maximum(boxes[:, 1], rect.y0), 0, None)
+    return min(1.0, float((widths * heights).sum()) / (rect.width * rect.height))
+
+def page_density(page):
+    """OCR 없이 페이지의 텍스트/이미지 밀도 측정 (추출 가능한 글자 수, 텍스트/이미지 영역 비율, 이미지 수, 벡터 그림 수)"""
+    blocks = page.get_text('blocks')
+    images = page.get_image_info()
+    return {
+        'text_chars': sum(len(''.join(block[4].split())) for block in blocks if block[6] == 0),
+        'text_coverage': round(box_coverage([block[:4] for block in blocks if block[6] == 0], page.rect), 4),
+        'image_coverage': round(box_coverage([image['bbox'] for image in images], page.rect), 4),
+        'images': len(images),
+        'drawings': len(page.get_cdrawings()),
+    }
+
+def route_page(density):
+    """텍스트가 거의 없고 이미지(스캔, 조각 이미지)나 벡터 그림(윤곽선으로 바뀐 글자)이 페이지를 채우면 'render', 아니면 'text'"""
+    if density['text_chars'] >= PAGE_RENDER_MAX_TEXT_CHARS:
+        return 'text'
+    if (density['image_coverage'] >= PAGE_RENDER_MIN_IMAGE_COVERAGE or density['images'] >= PAGE_RENDER_MIN_IMAGES
+            or density['drawings'] >= PAGE_RENDER_MIN_DRAWINGS):
+        return 'render'
+    return 'text'
+
+def render_page(page, dpi=PAGE_RENDER_DPI):
+    """페이지 전체를 한 장의 PNG로 렌더링하고 페이지 마크다운 반환
+
+    모델이 활용하는 최대 해상도(MAX_IMAGE_DIMENSION, MAX_IMAGE_PIXELS)를 넘지 않는 배율로 렌더링하여 인코딩 시 다시 줄이지 않음
+    """
+    width, height = page.rect.width, page.rect.height
+    zoom = min(dpi / 72, MAX_IMAGE_DIMENSION / max(width, height), math.sqrt(MAX_IMAGE_PIXELS / (width * height)))
+    pixmap = page.get_pixmap(matrix=pymupdf.Matrix(zoom, zoom), alpha=False)
+    # pymupdf4llm 추출 이미지와 같은 위치, 같은 파일명 규칙({PDF 파일명}-{페이지 번호}-page.png)으로 저장
+    image_name = f"{os.path.basename(page.parent.name).replace(' ', '-')}-{page.number}{PAGE_RENDER_SUFFIX}"
+    pixmap.save(image_name)
+    return f"![]({image_name})\n\n-----\n\n"
+
+def iter_routed_pages(pdf_path, pages=None, hdr_info=None, routing=PAGE_ROUTING_ENABLED):
+    """페이지마다 밀도를 측정해 마크다운 변환 또는 페이지 렌더링으로 처리하고 (페이지 마크다운, 라우팅 기록)을 순서대로 반환"""
+    with pymupdf.open(pdf_path) as doc:
+        if hdr_info is None:
+            # 제목 수준은 문서 전체의 글꼴 크기로 정해지므로 한 번만 계산하여 모든 페이지가 공유
+            hdr_info = IdentifyHeaders(doc)
+        for page_number in range(doc.page_count) if pages is None else pages:
+            started_at = time.perf_counter()
+            page = doc[page_number]
+            density = page_density(page) if routing else {}
+            route = route_page(density) if routing else 'text'
+            if route == 'render':
+                page_md = render_page(page)
+            else:
+                page_md = pymupdf4llm.to_markdown(
+                    doc, pages=[page_number], hdr_info=hdr_info, write_images=True, show_progress=False
+                )
+            record = {'page': page_number + 1, 'route': route, **density, 'seconds': round(time.perf_counter() - started_at, 4)}
+            yield page_md, record
+
+def convert_shard(pdf_path, pages, hdr_info):
+    """페이지 범위 하나를 마크다운으로 변환하고 (마크다운, 페이지별 라우팅 기록) 반환 (이미지 추출 포함)"""
+    page_mds = []
+    records = []
+    for page_md, record in iter_routed_pages(pdf_path, pages, hdr_info):
+        page_mds.append(page_md)
+        records.append(record)
+    return ''.join(page_mds), records
+
+def iter_pdf_pages(pdf_path, records=None):
+    """PDF를 한 페이지씩 마크다운으로 변환하여 순서대로 반환 (이미지 추출 포함, 문서 전체 텍스트를 만들지 않음)
+
+    records를 주면 페이지별 라우팅 기록을 추가
+    """
+    for page_md, record in iter_routed_pages(pdf_path):
+        if records is not None:
+            records.append(record)
+        yield page_md
+
+def convert_pdf_sharded(pdf_path, workers=PARSE_WORKERS, shard_pages=PARSE_SHARD_PAGES, records=None):
+    """페이지 범위를 나눠 프로세스 풀에서 변환한 뒤 페이지 순서대로 합침 (records를 주면 페이지별 라우팅 기록을 추가)"""
+    with pymupdf.open(pdf_path) as doc:
+        page_count = doc.page_count
+    shards = [list(range(start, min(start + shard_pages, page_count))) for start in range(0, page_count, shard_pages)]
+    # 제목 수준은 문서 전체의 글꼴 크기로 정해지므로 한 번만 계산하여 모든 샤드가 공유
+    hdr_info = IdentifyHeaders(str(pdf_path))
+    print(f"Converting {page_count} pages in {len(shards)} shards with {workers} processes...")
+    # 스레드에서 호출되어도 안전하도록 spawn 방식으로 프로세스를 생성
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        page_mds = []
+        for shard_md, shard_records in executor.map(
+            convert_shard, [str(pdf_path)] * len(shards), shards, [hdr_info] * len(shards)
+        ):
+            page_mds.append(shard_md)
+            if records is not None:
+                records.extend(shard_records)
+        return ''.join(page_mds)
+
+def write_page_routes(pdf_name, records):
+    """페이지별 라우팅 결정, 밀도 지표, 변환 시간을 {원본파일명}-1-pages.json에 기록하고 요약 출력"""
+    routes_path = pathlib.Path(f"{pdf_name}-1-pages.json")
+    routes_path.write_text(json.dumps(records, indent=2), encoding='utf-8')
+    rendered = [record for record in records if record['route'] == 'render']
+    print(
+        f"Page routing: {len(records) - len(rendered)} text pages, {len(rendered)} rendered pages "
+        f"({sum(record['seconds'] for record in rendered):.1f}s rendering, routes saved to {routes_path})"
+    )
+    return routes_path
+
+@timed('parse')
+def parse_pdf(pdf_path, checkpoint=None, workers=PARSE_WORKERS):
     """PDF를 파싱하여 초기 마크다운 파일 생성"""
     pdf_name = get_pdf_name(pdf_path)
     temp_dir = create_temp_dir()
     
-    # PDF를 마크다운으로 변환
-    md_text = pymupdf4llm.to_markdown(pdf_path, write_images=True)
+    # 같은 PDF를 이미 파싱했으면 이전 결과를 사용
+    pdf_hash = hash_file(pdf_path)
+    if checkpoint and checkpoint.is_stage_done('parse', pdf_hash):
+        print("Skipping PDF parsing: already completed (checkpoint)")
+        return checkpoint.stage_output('parse')
     
-    # 초기 마크다운 파일 생성
+    # PDF를 마크다운으로 변환하여 초기 마크다운 파일 생성 (이미지 파일명은 페이지 번호 기준이므로 샤드로 나눠도 동일)
+    # 텍스트가 거의 없는 스캔/이미지 페이지는 조각 이미지 대신 페이지 전체를 한 장으로 렌더링
     output_path = pathlib.Path(f"{pdf_name}-1-init.md")
-    output_path.write_text(md_text, encoding="utf-8")
+    records = []
+    if workers > 1:
+        output_path.write_text(convert_pdf_sharded(pdf_path, workers, records=records), encoding="utf-8")
+    else:
+        # 한 페이지씩 변환하여 바로 이어 쓰므로 메모리에는 한 페이지 분량만 유지
+        with output_path.open('w', encoding="utf-8") as f:
+            for page_md in iter_pdf_pages(pdf_path, records):
+                f.write(page_md)
+    write_page_routes(pdf_name, records)
     
     # 이미지 파일들을 temp 디렉토리로 이동
     for file in pathlib.Path().glob(f"{pdf_name}*.png"):
         shutil.move(str(file), str(temp_dir / file.name))
     
+    if checkpoint:
+        checkpoint.complete_stage('parse', pdf_hash, output_path)
     return output_path
 
 if __name__ == "__main__":
@@ -0,0 +1,167 @@
+import asyncio
+import json
+import pathlib
+from bedrock import get_bedrock_client
+from image_analyzer import (
+    find_image_names, filter_images, group_images, pack_image_batches, analyze_image_batch, insert_image_descriptions
+)
+from content_enhancer import process_chunk, summarize_chunk, INSTRUCTION
+from metrics import timed
+from chunker import make_packer, iter_markdown_pages
+from utils import OrderedWriter, hash_file, hash_text
+from config import (
+    MAX_IMAGE_WORKERS, MAX_CHUNK_WORKERS, STREAMING_ENABLED, IMAGE_FILTER_ENABLED, IMAGE_DEDUP_ENABLED,
+    ROLLING_CONTEXT_ENABLED, IMAGE_BATCH_SIZE, CHUNK_MODE, CHUNK_SIZE, CHUNK_TOKEN_BUDGET
+)
+
+async def run_pipeline_async(init_md_path, bedrock_client, checkpoint=None, stream=STREAMING_ENABLED,
+                             rolling_context=ROLLING_CONTEXT_ENABLED, course=None, image_batch_size=IMAGE_BATCH_SIZE):
+    """이미지 분석이 끝난 페이지부터 바로 콘텐츠 개선을 시작하는 비동기 파이프라인
+
+    rolling_context=True이면 앞 청크까지의 누적 요약 작업을 이어 만들고, 각 청크의 개선 요청은 바로 앞 요약 작업만 기다림
+    이미지 일괄 분석(IMAGE_BATCH_SIZE), 청크 분할 방식(CHUNK_MODE), 체크포인트의 청크별 재개는 순차 실행과 같게 동작
+    """
+    pdf_name = init_md_path.stem.replace('-1-init', '')
+    enhanced_path = init_md_path.with_name(f"{pdf_name}-2-enhanced{init_md_path.suffix}")
+    final_path = pathlib.Path(f"{pdf_name}-3-completed.md")
+    log_path = pathlib.Path(f"{pdf_name}-3-completed.log")
+
+    # 페이지별 이미지 목록만 먼저 모으고, 페이지 내용은 처리할 때 한 페이지씩 다시 읽음
+    input_hash = hash_file(init_md_path)
+    page_images = [find_image_names(page.split('\n')) for page in iter_markdown_pages(init_md_path)]
+    image_names = list(dict.fromkeys(name for names in page_images for name in names))
+
+    # 2단계 준비: 체크포인트, 장식용 이미지 필터, 중복 이미지 묶기는 순차 실행 (로컬 연산)
+    descriptions = {}
+    if checkpoint:
+        checkpoint.start_stage('images', input_hash)
+        descriptions = {name: desc for name, desc in checkpoint.completed_images().items() if name in image_names}
+        if descriptions:
+            print(f"Skipping {len(descriptions)} images already analyzed (checkpoint)")
+    pending_names = [name for name in image_names if name not in descriptions]
+    skipped = {}
+    if IMAGE_FILTER_ENABLED:
+        pending_names, skipped = filter_images(pending_names)
+    image_paths, members = group_images(pending_names, IMAGE_DEDUP_ENABLED)
+
+    # 2단계: 대표 이미지를 IMAGE_BATCH_SIZE 개씩 묶어 분석 작업을 만들고, 페이지는 자신의 이미지가 든 작업만 기다림
+    image_slots = asyncio.Semaphore(MAX_IMAGE_WORKERS)
+    names_by_path = {image_paths[representative]: representative for representative in members}
+
+    async def describe(batch):
+        async with image_slots:
+            print(f"Analyzing image{'s' if len(batch) > 1 else ''}: {', '.join(image_path.name for image_path in batch)}")
+            batch_descriptions = await asyncio.to_thread(analyze_image_batch, bedrock_client, batch)
+        for image_path, description in zip(batch, batch_descriptions):
+            for image_name in members[names_by_path[image_path]]:
+                descriptions[image_name] = description
+                if checkpoint:
+                    checkpoint.record_image(image_name, description)
+
+    image_tasks = {}
+    for batch in pack_image_batches([image_paths[representative] for representative in members], image_batch_size):
+        task = asyncio.create_task(describe(batch))
+        for image_path in batch:
+            for image_name in members[names_by_path[image_path]]:
+                image_tasks[image_name] = task
+
+    # 3단계 준비: 체크포인트에 기록된 청크는 원문이 같을 때만 다시 처리하지 않음
+    # (이미지 설명이 달라지면 같은 인덱스의 청크 내용도 달라지므로 청크 원문 해시로 확인)
+    completed_chunks = set()
+    if checkpoint:
+        checkpoint.start_stage('enhance', hash_text(f"pipeline:{CHUNK_MODE}:{CHUNK_SIZE}:{CHUNK_TOKEN_BUDGET}:{input_hash}"))
+        completed_chunks = checkpoint.completed_chunks()
+    skipped_chunks = 0
+
+    # 3단계: 완성된 청크는 바로 개선 요청을 보내고, 결과는 청크 순서대로 파일에 이어 씀
+    chunk_slots = asyncio.Semaphore(MAX_CHUNK_WORKERS)
+    pending_chunks = {}
+    chunk_count = 0
+    failed_indices = []
+    chunk_tasks = set()
+    summary_task = None
+    previous_chunk = None
+
+    async def summarize(previous_task, chunk):
+        previous = await previous_task if previous_task else ''
+        return await asyncio.to_thread(summarize_chunk, bedrock_client, previous, chunk)
+
+    async def enhance(index, chunk, context_task):
+        # 누적 요약을 기다리는 동안에는 동시 요청 슬롯을 차지하지 않음
+        context = await context_task if context_task else None
+        async with chunk_slots:
+            print(f"Processing chunk {index + 1}...")
+            return await asyncio.to_thread(process_chunk, bedrock_client, chunk, INSTRUCTION, stream, context, course)
+
+    def on_chunk_done(index, task):
+        chunk_tasks.discard(task)
+        chunk = pending_chunks.pop(index)
+        processed_chunk = task.result()
+        if not processed_chunk:
+            print(f"Error: Failed to process chunk {index + 1}")
+            failed_indices.append(index)
+        elif checkpoint:
+            checkpoint.record_chunk(index, processed_chunk, hash_text(chunk))
+        writer.write(index, processed_chunk or chunk)
+
+    def submit(new_chunks):
+        nonlocal chunk_count, summary_task, previous_chunk, skipped_chunks
+        for chunk in new_chunks:
+            index = chunk_count
+            chunk_count += 1
+            if rolling_context and previous_chunk is not None:
+                # 앞 청크의 요약은 다음 청크가 나왔을 때 만들어 마지막 청크의 요약 요청은 보내지 않음
+                # (건너뛰는 청크도 요약에 포함하며, 재실행 시에는 응답 캐시로 재사용)
+                summary_task = asyncio.create_task(summarize(summary_task, previous_chunk))
+            previous_chunk = chunk
+            if index in completed_chunks and checkpoint.chunk_source(index) == hash_text(chunk):
+                skipped_chunks += 1
+                writer.write(index, checkpoint.load_chunk(index))
+                continue
+            pending_chunks[index] = chunk
+            task = asyncio.create_task(enhance(index, chunk, summary_task))
+            task.add_done_callback(lambda task, index=index: on_chunk_done(index, task))
+            chunk_tasks.add(task)
+
+    packer = make_packer()
+    analyzed_images = set()
+    with OrderedWriter([final_path, log_path]) as writer, enhanced_path.open('w', encoding='utf-8') as enhanced_file:
+        for page_index, (page, names) in enumerate(zip(iter_markdown_pages(init_md_path), page_images)):
+            await asyncio.gather(*(image_tasks[name] for name in names if name in image_tasks))
+            page_md = '\n'.join(insert_image_descriptions(page.split('\n'), descriptions, analyzed_images))
+            enhanced_file.write(f"\n{page_md}" if page_index else page_md)
+            submit(packer.add(page_md))
+            # 개선 대기 중인 청크가 쌓이지 않도록 일부가 끝날 때까지 다음 페이지 진행을 멈춤
+            while len(chunk_tasks) >= MAX_CHUNK_WORKERS * 2:
+                await asyncio.wait(set(chunk_tasks), return_when=asyncio.FIRST_COMPLETED)
+        submit(packer.flush())
+        while chunk_tasks:
+            await asyncio.wait(set(chunk_tasks))
+
+    print(f"Enhanced markdown created: {enhanced_path}")
+    if skipped_chunks:
+        print(f"Skipped {skipped_chunks} chunks already processed (checkpoint)")
+    if skipped:
+        # 제외한 이미지와 사유 기록
+        skipped_path = init_md_path.with_name(f"{pdf_name}-2-skipped-images.json")
+        skipped_path.write_text(json.dumps(skipped, ensure_ascii=False, indent=2), encoding='utf-8')
+        print(f"Skipped {len(skipped)} decorative images (reasons saved to {skipped_path})")
+    if checkpoint and all(descriptions.get(name) for name in image_names if name not in skipped):
+        checkpoint.complete_stage('images', input_hash, enhanced_path)
+
+    if failed_indices and len(failed_indices) == chunk_count:
+        print("Error: Failed to process all chunks")
+        final_path.unlink()
+        log_path.unlink()
+        return None
+    if failed_indices:
+        print(f"Error: Failed to process chunks {', '.join(str(i + 1) for i in sorted(failed_indices))} (original text kept)")
+    print(f"Full content saved to log file: {log_path}")
+    return final_path
+
+@timed('pipeline')
+def run_pipeline(init_md_path, checkpoint=None, bedrock_client=None, course=None):
+    """2단계(이미지 분석)와 3단계(콘텐츠 개선)를 겹쳐서 실행하고 최종 마크다운 경로 반환 (course는 용어집을 공유하는 과목 이름)"""
+    if bedrock_client is None:
+        bedrock_client = get_bedrock_client()
+    return asyncio.run(run_pipeline_async(init_md_path, bedrock_client, checkpoint, course=course))
@@ -0,0 +1,147 @@
+import random
+import threading
+import time
+from botocore.exceptions import ClientError
+from config import (
+    MAX_REQUESTS_PER_MINUTE, MAX_TOKENS_PER_MINUTE, MIN_REQUESTS_PER_MINUTE,
+    RATE_INCREASE_RATIO, RATE_DECREASE_FACTOR, BASE_WAIT_TIME
+)
+
+# 쓰로틀링으로 간주하는 botocore 에러 코드
+THROTTLING_ERROR_CODES = {
+    'ThrottlingException',
+    'TooManyRequestsException',
+    'ServiceUnavailableException',
+}
+
+def get_error_code(error):
+    """botocore ClientError에서 에러 코드 추출"""
+    if isinstance(error, ClientError):
+        return error.response.get('Error', {}).get('Code')
+    return None
+
+def throttled_dimension(error):
+    """쓰로틀링 에러가 토큰 한도(TPM) 때문이면 'tokens', 그 외에는 'requests' 반환
+
+    Bedrock은 두 한도 모두 ThrottlingException으로 알리므로 메시지("Too many tokens" 등)로 구분
+    """
+    message = error.response.get('Error', {}).get('Message', '') if isinstance(error, ClientError) else str(error)
+    return 'tokens' if 'token' in message.lower() else 'requests'
+
+def is_throttling_error(error):
+    """쓰로틀링 에러 여부 확인"""
+    code = get_error_code(error)
+    if not code:
+        return False
+    # 스트리밍 응답의 에러 코드는 첫 글자가 소문자 (예: throttlingException)
+    return code[0].upper() + code[1:] in THROTTLING_ERROR_CODES
+
+class AdaptiveRateLimiter:
+    """RPM/TPM 토큰 버킷과 AIMD(additive increase, multiplicative decrease)로 호출 속도를 조절
+
+    RPM과 TPM은 따로 조절하여 쓰로틀링된 한도만 낮추고, 성공할 때마다 각 한도의 increase_ratio만큼 회복
+    """
+
+    BURST_SECONDS = 5  # 요청 버킷에 모아둘 수 있는 최대 시간
+
+    def __init__(
+        self,
+        max_rpm=MAX_REQUESTS_PER_MINUTE,
+        max_tpm=MAX_TOKENS_PER_MINUTE,
+        min_rpm=MIN_REQUESTS_PER_MINUTE,
+        increase_ratio=RATE_INCREASE_RATIO,
+        decrease_factor=RATE_DECREASE_FACTOR,
+        base_wait_time=BASE_WAIT_TIME,
+    ):
+        self.max_rpm = max_rpm
+        self.max_tpm = max_tpm
+        self.min_rpm = min_rpm
+        self.min_tpm = max_tpm * min_rpm / max_rpm
+        self.increase_ratio = increase_ratio
+        self.decrease_factor = decrease_factor
+        self.base_wait_time = base_wait_time
+        self.rpm = max_rpm
+        self.tpm = max_tpm
+        self._request_bucket = self._request_capacity()
+        self._token_bucket = max_tpm
+        self._updated_at = time.monotonic()
+        self._decreased_at = {}
+        self._lock = threading.Lock()
+
+    def _request_capacity(self):
+        return max(1.0, self.rpm / 60 * self.BURST_SECONDS)
+
+    def _token_capacity(self):
+        return self.tpm
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated_at
+        self._updated_at = now
+        self._request_bucket = min(self._request_capacity(), self._request_bucket + elapsed * self.rpm / 60)
+        token_capacity = self._token_capacity()
+        self._token_bucket = min(token_capacity, self._token_bucket + elapsed * token_capacity / 60)
+
+    def acquire(self, estimated_tokens=0):
+        """요청 1건과 예상 토큰만큼 버킷에서 차감 (여유가 없으면 대기)"""
+        while True:
+            with self._lock:
+                self._refill()
+                # 버킷 용량보다 큰 요청은 버킷이 가득 찼을 때 통과시켜 무한 대기를 방지
+                tokens_needed = min(estimated_tokens, self._token_capacity())
+                if self._request_bucket >= 1 and self._token_bucket >= tokens_needed:
+                    self._request_bucket -= 1
+                    self._token_bucket -= estimated_tokens
+                    return
+                request_wait = max(0.0, 1 - self._request_bucket) * 60 / self.rpm
+                token_wait = max(0.0, tokens_needed - self._token_bucket) * 60 / self._token_capacity()
+                wait_time = max(request_wait, token_wait)
+            time.sleep(wait_time)
+
+    def on_success(self, estimated_tokens=0, actual_tokens=None):
+        """성공 시 속도를 점진적으로 높이고, 실제 사용 토큰과의 차이를 버킷에 반영"""
+        with self._lock:
+            self.rpm = min(self.max_rpm, self.rpm + self.max_rpm * self.increase_ratio)
+            self.tpm = min(self.max_tpm, self.tpm + self.max_tpm * self.increase_ratio)
+            if actual_tokens is not None:
+                self._token_bucket = min(self._token_capacity(), self._token_bucket + estimated_tokens - actual_tokens)
+
+    def on_throttle(self, dimension='requests'):
+        """쓰로틀링 발생 시 쓰로틀링된 한도(dimension: 'requests' 또는 'tokens')만 비율만큼 낮추고 해당 버킷을 비움"""
+        with self._lock:
+            # 동시에 실행 중이던 요청들의 쓰로틀링으로 속도가 연달아 줄어들지 않도록 한 번만 감소
+            now = time.monotonic()
+            decreased_at = self._decreased_at.get(dimension)
+            decrease = decreased_at is None or now - decreased_at >= self.base_wait_time
+            if decrease:
+                self._decreased_at[dimension] = now
+            if dimension == 'tokens':
+                if decrease:
+                    self.tpm = max(self.min_tpm, self.tpm * self.decrease_factor)
+                self._token_bucket = min(self._token_bucket, 0.0)
+            else:
+                if decrease:
+                    self.rpm = max(self.min_rpm, self.rpm * self.decrease_factor)
+                self._request_bucket = 0.0
+
+    def backoff_time(self, retry_count):
+        """지터를 포함한 지수 백오프 대기 시간 계산"""
+        wait_time = self.base_wait_time * (2 ** retry_count)
+        return wait_time / 2 + random.uniform(0, wait_time / 2)
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+def get_rate_limiter():
+    """모든 Bedrock 호출이 공유하는 레이트 리미터 반환"""
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = AdaptiveRateLimiter()
+        return _rate_limiter
+
+def set_rate_limiter(limiter):
+    """공유 레이트 리미터를 교체 (벤치마크처럼 다른 한도로 실행할 때 사용)"""
+    global _rate_limiter
+    with _rate_limiter_lock:
+        _rate_limiter = limiter
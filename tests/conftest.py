@@ -0,0 +1,5 @@
+import pathlib
+import sys
+
+# 테스트에서 저장소 루트의 모듈을 import
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
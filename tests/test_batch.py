@@ -0,0 +1,9 @@
+import pathlib
+import pytest
+from batch import duplicate_pdf_names, run_batch
+
+def test_refuses_pdfs_with_same_name():
+    pdf_paths = [pathlib.Path('courses/a/lecture1.pdf'), pathlib.Path('courses/b/lecture1.pdf'), pathlib.Path('courses/a/lecture2.pdf')]
+    assert duplicate_pdf_names(pdf_paths) == {'lecture1': pdf_paths[:2]}
+    with pytest.raises(ValueError):
+        run_batch(pdf_paths)
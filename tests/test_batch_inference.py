@@ -0,0 +1,28 @@
+import pathlib
+import batch_inference
+import content_enhancer
+import image_analyzer
+import rate_limiter
+from benchmark import FakeBedrockClient, make_fixture_pdf
+from batch_inference import DirectoryBatchBackend, process_documents
+from cache import ResponseCache
+from pdf_parser import parse_pdf
+from rate_limiter import AdaptiveRateLimiter
+
+def test_unreadable_image_does_not_abort_batch(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    cache = ResponseCache(tmp_path / 'cache')
+    for module in (batch_inference, content_enhancer, image_analyzer):
+        monkeypatch.setattr(module, 'get_response_cache', lambda: cache)
+    monkeypatch.setattr(rate_limiter, '_rate_limiter', AdaptiveRateLimiter(max_rpm=100000, max_tpm=100000000))
+    init_md_path = parse_pdf(make_fixture_pdf(pathlib.Path('deck.pdf'), 4, 3))
+    image_names = image_analyzer.find_image_names(init_md_path.read_text(encoding='utf-8').split('\n'))
+    missing = next(name for name in image_names if not image_analyzer.is_page_render(name))
+    (pathlib.Path(image_analyzer.TEMP_DIR) / missing).unlink()
+
+    client = FakeBedrockClient(latency=0)
+    backend = DirectoryBatchBackend(tmp_path / 'batch-jobs', bedrock_client=client)
+    final_paths = process_documents([init_md_path], backend=backend, bedrock_client=client, min_records=0, poll_interval=0)
+    assert final_paths[init_md_path] is not None
+    enhanced = init_md_path.with_name('deck-2-enhanced.md').read_text(encoding='utf-8')
+    assert enhanced.count('이미지 설명') == len([name for name in image_names if not image_analyzer.is_page_render(name)]) - 1
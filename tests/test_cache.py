@@ -0,0 +1,22 @@
+from cache import ResponseCache
+
+def test_evicts_least_recently_used_entries_over_limit(tmp_path):
+    cache = ResponseCache(tmp_path, max_bytes=300)
+    for key in ('a', 'b', 'c'):
+        cache.put(key, 'x' * 100)
+    assert cache.get('a') is not None
+    cache.put('d', 'x' * 100)
+
+    assert cache.get('b') is None
+    assert all(cache.get(key) is not None for key in ('a', 'c', 'd'))
+    assert cache.total_bytes == 300
+
+def test_index_is_restored_from_directory(tmp_path):
+    cache = ResponseCache(tmp_path, max_bytes=1000)
+    cache.put('a', 'x' * 100)
+    cache.put('a', 'y' * 50)
+    cache.put('b', 'x' * 100)
+
+    reopened = ResponseCache(tmp_path, max_bytes=1000)
+    assert reopened.total_bytes == 150
+    assert reopened.get('a') == 'y' * 50
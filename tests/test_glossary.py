@@ -0,0 +1,38 @@
+from glossary import Glossary
+
+def test_learn_multi_word_terms(tmp_path):
+    glossary = Glossary(tmp_path / 'glossary.db')
+    text = (
+        "이 모델은 강화 학습(RL, Reinforcement Learning: 보상을 최대화하도록 행동을 학습하는 방법)으로 학습한다.\n"
+        "가장 널리 쓰이는 방법은 경사 하강법(Gradient Descent: 손실 함수의 기울기를 따라 내려가는 방법)이다.\n"
+        "그 값(X, x value: 한 글자 용어는 저장하지 않는다)"
+    )
+    assert glossary.learn('ml', text) == 2
+    assert set(glossary.terms('ml')) == {'강화 학습', '경사 하강법'}
+
+def test_lookup_matches_whole_terms(tmp_path):
+    glossary = Glossary(tmp_path / 'glossary.db')
+    glossary.learn('ml', "강화 학습(RL, Reinforcement Learning: 보상을 최대화하도록 행동을 학습하는 방법)")
+    assert glossary.lookup('ml', "지도 학습은 정답이 있는 데이터로 학습한다.") == []
+    assert glossary.lookup('ml', "강화 학습률을 조정한다.") == []
+    assert [term for term, _, _ in glossary.lookup('ml', "심층 강화 학습은 게임에서 쓰인다.")] == ['강화 학습']
+    assert [term for term, _, _ in glossary.lookup('ml', "Reinforcement learning agents")] == ['강화 학습']
+
+def test_cached_chunk_terms_are_expanded(tmp_path, monkeypatch):
+    import content_enhancer
+    from cache import ResponseCache
+    from model_router import model_for, route_chunk
+    glossary = Glossary(tmp_path / 'glossary.db')
+    glossary.learn('ml', "강화 학습(RL, Reinforcement Learning: 보상을 최대화하도록 행동을 학습하는 방법)")
+    cache = ResponseCache(tmp_path / 'cache', max_bytes=10000)
+    monkeypatch.setattr(content_enhancer, 'get_glossary', lambda: glossary)
+    monkeypatch.setattr(content_enhancer, 'get_response_cache', lambda: cache)
+
+    # 배치 추론 경로처럼 용어 표기가 남은 응답을 같은 키로 캐시에 저장
+    chunk = "강화 학습은 보상을 이용한다."
+    terms = glossary.lookup('ml', chunk)
+    key = cache.make_key(model_for(route_chunk(chunk)), 'instruction', content_enhancer.chunk_cache_payload(chunk, None, terms))
+    cache.put(key, "[[용어:강화 학습]]은 보상을 이용한다.")
+
+    processed = content_enhancer.process_chunk(None, chunk, 'instruction', stream=False, course='ml')
+    assert processed == "강화 학습(RL, Reinforcement Learning: 보상을 최대화하도록 행동을 학습하는 방법)은 보상을 이용한다."
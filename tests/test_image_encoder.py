@@ -0,0 +1,21 @@
+from PIL import Image, ImageDraw
+from image_encoder import ImageEncoder
+
+def test_large_line_art_is_encoded_as_png(tmp_path):
+    # 축소 후에는 안티앨리어싱으로 256색을 넘는 다이어그램
+    img = Image.new('RGB', (3000, 2000), 'white')
+    draw = ImageDraw.Draw(img)
+    for i in range(100):
+        draw.line((0, i * 20, 3000, 2000 - i * 20), fill=(i * 2, 255 - i * 2, 100), width=3)
+    img.save(tmp_path / 'diagram.png')
+
+    _, media_type = ImageEncoder().encode_image(tmp_path / 'diagram.png')
+    assert media_type == 'image/png'
+
+def test_cache_is_bounded_by_bytes(tmp_path):
+    encoder = ImageEncoder(max_bytes=1)
+    for i in range(3):
+        Image.new('RGB', (64, 64), (i * 80, 0, 0)).save(tmp_path / f"{i}.png")
+        encoder.encode_image(tmp_path / f"{i}.png")
+    assert len(encoder._encoded) == 1
+    assert encoder.cached_bytes == len(next(iter(encoder._encoded.values()))[0])
@@ -0,0 +1,32 @@
+import shutil
+from PIL import Image, ImageDraw
+import image_analyzer
+from image_hash import dhash
+
+def make_text_page(path, seed):
+    """흰 배경에 글자 줄만 있는 스캔 페이지 이미지 생성 (seed마다 다른 내용)"""
+    img = Image.new('RGB', (1240, 1754), 'white')
+    draw = ImageDraw.Draw(img)
+    for line in range(40):
+        text = ' '.join(f"word{(seed * 7919 + line * 31 + i) % 997}" for i in range(12))
+        draw.text((100, 100 + line * 38), text, fill='black')
+    img.save(path)
+
+def test_different_text_pages_are_not_merged(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_analyzer, 'TEMP_DIR', str(tmp_path))
+    make_text_page(tmp_path / 'deck.pdf-1-page.png', 1)
+    make_text_page(tmp_path / 'deck.pdf-3-page.png', 3)
+    # 8x8 dHash로는 구분되지 않는 페이지여야 의미 있는 테스트
+    distance = (dhash(tmp_path / 'deck.pdf-1-page.png', 8) != dhash(tmp_path / 'deck.pdf-3-page.png', 8)).sum()
+    assert distance <= 4
+
+    _, members = image_analyzer.group_images(['deck.pdf-1-page.png', 'deck.pdf-3-page.png'], dedup=True)
+    assert members == {'deck.pdf-1-page.png': ['deck.pdf-1-page.png'], 'deck.pdf-3-page.png': ['deck.pdf-3-page.png']}
+
+def test_identical_page_renders_share_analysis(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_analyzer, 'TEMP_DIR', str(tmp_path))
+    make_text_page(tmp_path / 'deck.pdf-1-page.png', 1)
+    shutil.copyfile(tmp_path / 'deck.pdf-1-page.png', tmp_path / 'deck.pdf-2-page.png')
+
+    _, members = image_analyzer.group_images(['deck.pdf-1-page.png', 'deck.pdf-2-page.png'], dedup=True)
+    assert members == {'deck.pdf-1-page.png': ['deck.pdf-1-page.png', 'deck.pdf-2-page.png']}
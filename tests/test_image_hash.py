@@ -0,0 +1,32 @@
+import io
+from PIL import Image, ImageDraw
+from image_hash import group_similar_images
+
+def make_code_screenshot(path, lines):
+    """어두운 배경에 코드 줄이 있는 스크린샷 이미지 생성"""
+    img = Image.new('RGB', (900, 600), (30, 30, 30))
+    draw = ImageDraw.Draw(img)
+    for i, line in enumerate(lines):
+        draw.text((20, 20 + i * 22), line, fill=(220, 220, 220))
+    img.save(path)
+
+def test_text_images_with_different_content_are_not_merged(tmp_path):
+    lines = [f"    x{i} = compute(a{i}, b{i}) + {i * 3}" for i in range(25)]
+    changed = lines.copy()
+    changed[5] = changed[5].replace('15', '16')
+    make_code_screenshot(tmp_path / 'a.png', lines)
+    make_code_screenshot(tmp_path / 'b.png', changed)
+    make_code_screenshot(tmp_path / 'c.png', [line.replace('compute', 'evaluate') for line in lines])
+
+    groups = group_similar_images([tmp_path / 'a.png', tmp_path / 'b.png', tmp_path / 'c.png'])
+    assert all(path == representative for path, representative in groups.items())
+
+def test_rescaled_copy_is_merged(tmp_path):
+    make_code_screenshot(tmp_path / 'a.png', [f"line {i}" for i in range(25)])
+    with Image.open(tmp_path / 'a.png') as img:
+        buffer = io.BytesIO()
+        img.resize((540, 360), Image.LANCZOS).save(buffer, format='JPEG', quality=70)
+    (tmp_path / 'a-small.jpg').write_bytes(buffer.getvalue())
+
+    groups = group_similar_images([tmp_path / 'a.png', tmp_path / 'a-small.jpg'])
+    assert groups[tmp_path / 'a-small.jpg'] == tmp_path / 'a.png'
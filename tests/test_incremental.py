@@ -0,0 +1,66 @@
+import json
+import pathlib
+import chunker
+import content_enhancer
+import image_analyzer
+import incremental
+import rate_limiter
+from botocore.exceptions import ClientError
+from benchmark import FakeBedrockClient, make_fixture_pdf
+from incremental import process_incremental
+from pdf_parser import parse_pdf
+from rate_limiter import AdaptiveRateLimiter
+
+class FailingImageClient(FakeBedrockClient):
+    """이미지 분석 요청만 실패하는 가짜 클라이언트"""
+
+    def _respond(self, model_id, body):
+        if '"image"' in body:
+            raise ClientError({'Error': {'Code': 'ValidationException', 'Message': 'Invalid image'}}, 'InvokeModel')
+        return super()._respond(model_id, body)
+
+def prepare(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(content_enhancer, 'get_response_cache', lambda: None)
+    monkeypatch.setattr(image_analyzer, 'get_response_cache', lambda: None)
+    monkeypatch.setattr(rate_limiter, '_rate_limiter', AdaptiveRateLimiter(max_rpm=100000, max_tpm=100000000))
+    return parse_pdf(make_fixture_pdf(pathlib.Path('deck.pdf'), 6, 3))
+
+def test_failed_images_are_retried(tmp_path, monkeypatch):
+    init_md_path = prepare(tmp_path, monkeypatch)
+    process_incremental(init_md_path, bedrock_client=FailingImageClient(latency=0), stream=False)
+
+    client = FakeBedrockClient(latency=0)
+    final_path = process_incremental(init_md_path, bedrock_client=client, stream=False)
+    assert client.calls > 0
+    assert '이미지 설명' in final_path.read_text(encoding='utf-8')
+
+def test_new_groups_follow_fixed_chunk_mode(tmp_path, monkeypatch):
+    init_md_path = prepare(tmp_path, monkeypatch)
+    monkeypatch.setattr(chunker.chunk_content, '__defaults__', ('fixed',))
+    process_incremental(init_md_path, bedrock_client=FakeBedrockClient(latency=0), stream=False)
+
+    groups = json.loads((tmp_path / 'checkpoints' / 'deck-revision.json').read_text(encoding='utf-8'))['groups']
+    outputs = [output for group in groups for output in group['outputs']]
+    assert len(outputs) > len(groups)
+    assert all(len(output) <= chunker.CHUNK_SIZE for output in outputs)
+
+class FailingClient(FakeBedrockClient):
+    """모든 요청이 실패하는 가짜 클라이언트"""
+
+    def _respond(self, model_id, body):
+        raise ClientError({'Error': {'Code': 'ValidationException', 'Message': 'Invalid request'}}, 'InvokeModel')
+
+def test_returns_none_when_all_chunks_fail(tmp_path, monkeypatch):
+    init_md_path = prepare(tmp_path, monkeypatch)
+    assert process_incremental(init_md_path, bedrock_client=FailingClient(latency=0), stream=False) is None
+    assert not (tmp_path / 'deck-3-completed.md').exists()
+
+def test_groups_without_chunks_are_saved(tmp_path, monkeypatch):
+    init_md_path = prepare(tmp_path, monkeypatch)
+    # 빈 페이지만 있는 묶음처럼 청크가 하나도 없는 경우
+    monkeypatch.setattr(incremental, 'chunk_content', lambda content: [])
+    process_incremental(init_md_path, bedrock_client=FakeBedrockClient(latency=0), stream=False)
+
+    groups = json.loads((tmp_path / 'checkpoints' / 'deck-revision.json').read_text(encoding='utf-8'))['groups']
+    assert groups and all(group['outputs'] == [] for group in groups)
@@ -0,0 +1,20 @@
+import threading
+import time
+from metrics import MetricsRecorder
+
+def sleep_in_stage(metrics, stage):
+    with metrics.measure(stage):
+        time.sleep(0.2)
+
+def test_total_wall_time_is_run_elapsed_time():
+    metrics = MetricsRecorder()
+    with metrics.measure_run():
+        threads = [threading.Thread(target=sleep_in_stage, args=(metrics, stage)) for stage in ('images', 'enhance')]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    summary = metrics.summary()
+    # 두 단계가 겹쳐 실행되었으므로 total 소요 시간은 단계 합계(0.4초 이상)보다 짧아야 함
+    assert sum(stage['wall_time'] for stage in summary['stages'].values()) >= 0.4
+    assert 0.2 <= summary['total']['wall_time'] < 0.35
@@ -0,0 +1,25 @@
+import numpy as np
+from PIL import Image
+import model_router
+from image_analyzer import pack_image_batches
+
+def make_images(tmp_path, count):
+    """단색과 잡음 이미지를 번갈아 생성 (복잡도 기준으로는 경로가 나뉨)"""
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(count):
+        pixels = rng.integers(0, 255, (64, 64, 3), dtype=np.uint8) if i % 2 else np.full((64, 64, 3), 200, dtype=np.uint8)
+        Image.fromarray(pixels).save(tmp_path / f"rt{i}.png")
+        paths.append(tmp_path / f"rt{i}.png")
+    return paths
+
+def test_batches_are_not_split_when_routing_is_disabled(tmp_path, monkeypatch):
+    monkeypatch.setattr(model_router, 'MODEL_ROUTING_ENABLED', False)
+    paths = make_images(tmp_path, 6)
+    assert {model_router.route_image(path) for path in paths} == {'image'}
+    assert pack_image_batches(paths, batch_size=6) == [paths]
+
+def test_batches_are_split_by_model_when_routing_is_enabled(tmp_path, monkeypatch):
+    monkeypatch.setattr(model_router, 'MODEL_ROUTING_ENABLED', True)
+    paths = make_images(tmp_path, 6)
+    assert pack_image_batches(paths, batch_size=6) == [paths[0::2], paths[1::2]]
@@ -0,0 +1,73 @@
+import asyncio
+import pathlib
+import chunker
+import content_enhancer
+import image_analyzer
+import pipeline
+import rate_limiter
+from benchmark import FakeBedrockClient, make_fixture_pdf
+from checkpoint import Checkpoint
+from content_enhancer import enhance_content
+from image_analyzer import analyze_images_in_markdown
+from pdf_parser import parse_pdf
+from rate_limiter import AdaptiveRateLimiter
+
+def prepare(tmp_path, monkeypatch, pages=12, images=6):
+    """임시 디렉토리에서 합성 PDF를 파싱하고 응답 캐시 없이 실행하도록 설정"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(content_enhancer, 'get_response_cache', lambda: None)
+    monkeypatch.setattr(image_analyzer, 'get_response_cache', lambda: None)
+    monkeypatch.setattr(rate_limiter, '_rate_limiter', AdaptiveRateLimiter(max_rpm=100000, max_tpm=100000000))
+    pdf_path = make_fixture_pdf(pathlib.Path('deck.pdf'), pages, images)
+    return pdf_path, parse_pdf(pdf_path)
+
+def run(init_md_path, client, checkpoint=None, image_batch_size=1):
+    return asyncio.run(pipeline.run_pipeline_async(
+        init_md_path, client, checkpoint, stream=False, rolling_context=False, image_batch_size=image_batch_size
+    ))
+
+def test_pipeline_resumes_completed_chunks(tmp_path, monkeypatch):
+    pdf_path, init_md_path = prepare(tmp_path, monkeypatch)
+    first = FakeBedrockClient(latency=0)
+    final_path = run(init_md_path, first, Checkpoint(pdf_path, tmp_path / 'checkpoints'))
+    output = final_path.read_text(encoding='utf-8')
+
+    second = FakeBedrockClient(latency=0)
+    final_path = run(init_md_path, second, Checkpoint(pdf_path, tmp_path / 'checkpoints'))
+    assert second.calls == 0
+    assert final_path.read_text(encoding='utf-8') == output
+
+def test_pipeline_batches_images(tmp_path, monkeypatch):
+    _, init_md_path = prepare(tmp_path, monkeypatch)
+    client = FakeBedrockClient(latency=0)
+    run(init_md_path, client, image_batch_size=3)
+
+    single = FakeBedrockClient(latency=0)
+    run(init_md_path, single)
+    assert client.calls < single.calls
+
+def test_pipeline_follows_fixed_chunk_mode(tmp_path, monkeypatch):
+    _, init_md_path = prepare(tmp_path, monkeypatch)
+    monkeypatch.setattr(chunker.make_packer, '__defaults__', ('fixed',))
+    monkeypatch.setattr(chunker.iter_chunks, '__defaults__', ('fixed',))
+    client = FakeBedrockClient(latency=0)
+    pipelined = run(init_md_path, client).read_text(encoding='utf-8')
+
+    sequential_client = FakeBedrockClient(latency=0)
+    enhanced_md_path = analyze_images_in_markdown(init_md_path, bedrock_client=sequential_client)
+    sequential = enhance_content(enhanced_md_path, bedrock_client=sequential_client).read_text(encoding='utf-8')
+    assert client.calls == sequential_client.calls
+    assert pipelined == sequential
+
+def test_image_batch_marks_only_unreadable_image_failed(tmp_path, monkeypatch):
+    from PIL import Image
+    from cache import ResponseCache
+    monkeypatch.setattr(rate_limiter, '_rate_limiter', AdaptiveRateLimiter(max_rpm=100000, max_tpm=100000000))
+    monkeypatch.setattr(image_analyzer, 'get_response_cache', lambda: ResponseCache(tmp_path / 'cache'))
+    image_paths = [str(tmp_path / f"image{i}.png") for i in range(3)]
+    for i, image_path in enumerate(image_paths[:2]):
+        Image.new('RGB', (64, 64), (i * 100, 0, 0)).save(image_path)
+
+    descriptions = image_analyzer.analyze_image_batch(FakeBedrockClient(latency=0), image_paths)
+    assert all(descriptions[:2])
+    assert descriptions[2] is None
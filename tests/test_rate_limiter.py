@@ -0,0 +1,30 @@
+from botocore.exceptions import ClientError
+from rate_limiter import AdaptiveRateLimiter, throttled_dimension
+
+def throttling_error(message):
+    return ClientError({'Error': {'Code': 'ThrottlingException', 'Message': message}}, 'InvokeModel')
+
+def test_throttled_dimension_from_message():
+    assert throttled_dimension(throttling_error('Too many tokens, please wait before trying again.')) == 'tokens'
+    assert throttled_dimension(throttling_error('Too many requests, please wait before trying again.')) == 'requests'
+
+def test_request_throttle_keeps_token_budget():
+    limiter = AdaptiveRateLimiter(max_rpm=6000, max_tpm=1000000, base_wait_time=0)
+    limiter.on_throttle('requests')
+    assert limiter.rpm == 3000
+    assert limiter.tpm == 1000000
+
+def test_token_throttle_keeps_request_rate():
+    limiter = AdaptiveRateLimiter(max_rpm=6000, max_tpm=1000000, base_wait_time=0)
+    limiter.on_throttle('tokens')
+    assert limiter.rpm == 6000
+    assert limiter.tpm == 500000
+
+def test_recovery_is_scaled_to_limits():
+    limiter = AdaptiveRateLimiter(max_rpm=6000, max_tpm=1000000, base_wait_time=0, increase_ratio=0.05)
+    limiter.on_throttle('requests')
+    limiter.on_throttle('tokens')
+    for _ in range(10):
+        limiter.on_success()
+    assert limiter.rpm == 6000
+    assert limiter.tpm == 1000000
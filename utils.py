@@ -1,5 +1,5 @@
+import hashlib
 import pathlib
-import time
 
 def create_temp_dir():
     """임시 디렉토리 생성"""
@@ -7,11 +7,72 @@ def create_temp_dir():
     temp_dir.mkdir(exist_ok=True)
     return temp_dir
 
+PAGE_RENDER_SUFFIX = '-page.png'  # 페이지 전체를 렌더링한 이미지 파일명 끝부분
+
+def is_page_render(image_path):
+    """페이지 전체를 렌더링한 이미지인지 확인"""
+    return str(image_path).endswith(PAGE_RENDER_SUFFIX)
+
 def get_pdf_name(pdf_path):
     """PDF 파일 이름 추출"""
     return pathlib.Path(pdf_path).stem
 
-def wait_with_backoff(retry_count, base_wait_time=3):
-    """지수 백오프를 사용한 대기"""
-    wait_time = base_wait_time * (2 ** retry_count)
-    time.sleep(wait_time)
+def iter_lines(path):
+    """파일을 read_text().split('\\n')과 같은 라인 단위로 하나씩 읽음 (파일 전체를 메모리에 올리지 않음)"""
+    with open(path, encoding='utf-8') as f:
+        line = ''
+        for line in f:
+            yield line[:-1] if line.endswith('\n') else line
+        if not line or line.endswith('\n'):
+            yield ''
+
+def estimate_tokens(text):
+    """텍스트의 토큰 수 추정 (한국어가 섞인 텍스트는 대략 2자당 1토큰)"""
+    return len(text) // 2
+
+class OrderedWriter:
+    """순서 없이 도착하는 결과를 인덱스 순서대로 여러 파일에 이어 쓰기"""
+
+    def __init__(self, paths, separator="\n\n"):
+        self.files = [open(path, 'w', encoding='utf-8') for path in paths]
+        self.separator = separator
+        self.pending = {}
+        self.next_index = 0
+
+    def write(self, index, text):
+        """결과를 저장하고, 앞 순서의 결과가 모두 도착했으면 파일에 기록"""
+        self.pending[index] = text
+        while self.next_index in self.pending:
+            text = self.pending.pop(self.next_index)
+            for file in self.files:
+                if self.next_index > 0:
+                    file.write(self.separator)
+                file.write(text)
+                file.flush()
+            self.next_index += 1
+
+    def close(self):
+        for file in self.files:
+            file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def hash_bytes(data):
+    """바이트 데이터의 SHA-256 해시"""
+    return hashlib.sha256(data).hexdigest()
+
+def hash_text(text):
+    """텍스트의 SHA-256 해시"""
+    return hash_bytes(text.encode('utf-8'))
+
+def hash_file(path, block_size=1024 * 1024):
+    """파일 내용의 SHA-256 해시 (큰 파일도 block_size 단위로 읽음)"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()